@@ -1,9 +1,9 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-from datetime import datetime
 import os
-from chatbot import MultiLanguageChatbot
+import uuid
+import metrics
+from client import create_client
+from latency_budget import DECODING_TIERS, DEFAULT_TIER
 
 # Page configuration
 st.set_page_config(
@@ -13,52 +13,81 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize the chatbot
+def build_local_pipeline():
+    """Create the in-process pipeline used when no API server is configured"""
+    from chatbot import MultiLanguageChatbot
+    from pipeline import ChatPipeline
+    from retention import start_retention
+    from storage import ConversationStore
+    store = ConversationStore('chat_history.db', archive_dir=os.environ.get("CHATBOT_ARCHIVE_DIR", "chat_archive"))
+    # Archive old conversations and reclaim free pages in the background
+    start_retention(store)
+    return ChatPipeline(MultiLanguageChatbot(), store)
+
+# Initialize the chatbot client (API server if CHATBOT_API_URL is set, otherwise in-process)
 @st.cache_resource
-def load_chatbot():
-    return MultiLanguageChatbot()
-
-def init_database():
-    """Initialize SQLite database for chat history"""
-    conn = sqlite3.connect('chat_history.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            user_message TEXT,
-            bot_response TEXT,
-            detected_language TEXT,
-            translated_message TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def save_conversation(user_msg, bot_response, detected_lang, translated_msg):
-    """Save conversation to database"""
-    conn = sqlite3.connect('chat_history.db')
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO conversations (timestamp, user_message, bot_response, detected_language, translated_message)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (datetime.now().isoformat(), user_msg, bot_response, detected_lang, translated_msg))
-    conn.commit()
-    conn.close()
-
-def load_chat_history():
-    """Load chat history from database"""
-    conn = sqlite3.connect('chat_history.db')
-    df = pd.read_sql_query("SELECT * FROM conversations ORDER BY timestamp DESC LIMIT 50", conn)
-    conn.close()
-    return df
+def load_client():
+    if os.environ.get("CHATBOT_METRICS_PORT"):
+        # Serve /metrics from this process when running without the API server
+        metrics.start_http_server(int(os.environ["CHATBOT_METRICS_PORT"]))
+    return create_client(pipeline_factory=build_local_pipeline)
 
-def main():
-    # Initialize database
-    init_database()
+HISTORY_PAGE_SIZE = 5
+
+# Most recent chat messages rendered on each rerun; older ones stay collapsed until requested
+CHAT_WINDOW = int(os.environ.get("CHATBOT_CHAT_WINDOW", "50"))
+
+# Only the chat area reruns on a new message when this Streamlit version supports fragments
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+# History queries are cached per history version, which changes on every insert or clear,
+# so reruns reuse the last result until the data actually changes
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_search(version, query, languages, cursor=None, limit=HISTORY_PAGE_SIZE, min_id=None):
+    return load_client().search_history(query, list(languages), cursor=cursor, limit=limit, min_id=min_id)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_languages(version):
+    return load_client().languages()
+
+# The Loaded Models panel runs on every rerun even when collapsed; a few seconds stale is fine there
+@st.cache_data(ttl=5, show_spinner=False)
+def cached_model_status():
+    return load_client().model_status()
+
+def load_history(query, languages, version):
+    """Load the sidebar history rows for the current filters, including pages added by Load more"""
+    filters = (query, tuple(languages))
+    state = st.session_state.get("history")
+    if state is None or state["filters"] != filters:
+        state = st.session_state.history = {"filters": filters, "floor": None, "more": False}
     
-    # Load chatbot
-    chatbot = load_chatbot()
+    if state["floor"] is None:
+        rows, cursor = cached_search(version, query, filters[1], limit=HISTORY_PAGE_SIZE)
+        state["more"] = cursor is not None
+    else:
+        # Everything down to the oldest loaded row, so new messages never leave a gap
+        rows, _ = cached_search(version, query, filters[1], min_id=state["floor"], limit=None)
+    return rows
+
+def load_more_history(cursor, version):
+    """Fetch the next older page of history below cursor"""
+    state = st.session_state.history
+    query, languages = state["filters"]
+    rows, next_cursor = cached_search(version, query, languages, cursor=cursor, limit=HISTORY_PAGE_SIZE)
+    if rows:
+        state["floor"] = rows[-1]["id"]
+    state["more"] = next_cursor is not None
+
+def prefetch_selected_model():
+    try:
+        load_client().prefetch_model(st.session_state.model_option)
+    except Exception:
+        pass  # Prefetching is only an optimisation; the first message loads the model anyway
+
+def main():
+    # Load chatbot client
+    client = load_client()
     
     # Header
     st.title("🌍 Multi-Language AI Chatbot")
@@ -75,99 +104,78 @@ def main():
              "russian", "chinese", "japanese", "korean", "arabic", "hindi"]
         )
         
-        # Model selection
+        # Model selection; a newly picked model starts loading while the user types
         model_option = st.selectbox(
             "Chatbot Model:",
-            ["DialoGPT (Fast)", "BlenderBot (Better)", "FLAN-T5 (Instruction)"]
+            ["DialoGPT (Fast)", "BlenderBot (Better)", "FLAN-T5 (Instruction)"],
+            key="model_option",
+            on_change=prefetch_selected_model
+        )
+        
+        # Latency tier: decoding strategy and token limit chosen to fit the time budget
+        response_speed = st.selectbox(
+            "Response Speed:",
+            list(DECODING_TIERS),
+            index=list(DECODING_TIERS).index(DEFAULT_TIER),
+            format_func=lambda name: f"{name.title()} (≤ {DECODING_TIERS[name].budget_seconds:.0f}s)"
         )
         
         # Translation option
         enable_translation = st.checkbox("Enable Translation", value=True)
         
+        # Per-message stage timings in the metadata caption
+        show_timings = st.checkbox("Show timing breakdown", value=False)
+        
+        # Loaded models and their estimated memory use
+        with st.expander("🧠 Loaded Models"):
+            status = cached_model_status()
+            for name, size_mb in status["memory"].items():
+                st.write(f"**{name}:** {size_mb:.0f} MB")
+            if not status["memory"]:
+                st.caption("No models loaded yet.")
+            for event in status["events"][-5:]:
+                st.caption(f"{event['event']}: {event['model']} ({event['mode']})")
+            for tier, stats in status.get("latency_budget", {}).items():
+                st.caption(f"{tier}: {stats['mean_seconds']:.1f}s of {stats['mean_budget']:.0f}s on average, "
+                           f"{stats['deadline_hits']}/{stats['requests']} cut at the deadline")
+            for name, stats in status.get("assisted_decoding", {}).items():
+                st.caption(f"{name} draft: {stats['acceptance_rate']:.0%} of tokens accepted, "
+                           f"{stats['tokens_per_pass']:.1f} tokens per pass")
+            if status.get("semantic_index"):
+                stats = status["semantic_index"]
+                st.caption(f"Similar-question answers: {stats['hits']}/{stats['lookups']} reused "
+                           f"({stats['entries']} indexed, {stats['lookup_mean_ms']:.1f} ms per lookup)")
+        
         st.markdown("---")
         
         # Chat history
         st.header("📚 Recent Chats")
         if st.button("Clear History"):
-            conn = sqlite3.connect('chat_history.db')
-            c = conn.cursor()
-            c.execute("DELETE FROM conversations")
-            conn.commit()
-            conn.close()
+            client.clear_history(st.session_state.get("session_id"))
             st.success("History cleared!")
             st.rerun()
         
-        # Show recent conversations
-        history_df = load_chat_history()
-        if not history_df.empty:
-            for _, row in history_df.head(5).iterrows():
-                with st.expander(f"🕒 {row['timestamp'][:16]}"):
-                    st.write(f"**You ({row['detected_language']}):** {row['user_message'][:100]}...")
-                    st.write(f"**Bot:** {row['bot_response'][:100]}...")
+        # Search filters
+        history_version = client.history_version()
+        search_query = st.text_input("🔎 Search chats:")
+        language_filter = st.multiselect("Languages:", cached_languages(history_version))
+        
+        # Show conversations, newest first
+        history_rows = load_history(search_query, language_filter, history_version)
+        for row in history_rows:
+            with st.expander(f"🕒 {row['timestamp'][:16]}"):
+                st.write(f"**You ({row['detected_language']}):** {row['user_message'][:100]}...")
+                st.write(f"**Bot:** {row['bot_response'][:100]}...")
+        if not history_rows:
+            st.caption("No conversations found.")
+        elif st.session_state.history["more"]:
+            st.button("Load more", on_click=load_more_history, args=(history_rows[-1]["id"], history_version))
     
     # Main chat interface
     col1, col2 = st.columns([3, 1])
     
     with col1:
-        # Chat container
-        chat_container = st.container()
-        
-        # Initialize session state
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-        
-        # Display chat messages
-        with chat_container:
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
-                    if "metadata" in message:
-                        st.caption(message["metadata"])
-        
-        # Chat input
-        if prompt := st.chat_input("Type your message in any language..."):
-            # Add user message to chat
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            
-            with st.chat_message("user"):
-                st.markdown(prompt)
-            
-            # Process with chatbot
-            with st.chat_message("assistant"):
-                with st.spinner("🤔 Thinking..."):
-                    # Detect language
-                    detected_lang = chatbot.detect_language(prompt)
-                    
-                    # Translate if needed
-                    translated_prompt = prompt
-                    if enable_translation and detected_lang != 'en':
-                        translated_prompt = chatbot.translate_text(prompt, 'en')
-                    
-                    # Generate response
-                    response = chatbot.generate_response(translated_prompt, model_option)
-                    
-                    # Translate response back if needed
-                    final_response = response
-                    if enable_translation and target_language != "auto" and target_language != "english":
-                        final_response = chatbot.translate_text(response, target_language)
-                    
-                    # Display response
-                    st.markdown(final_response)
-                    
-                    # Show metadata
-                    metadata = f"🔍 Detected: {detected_lang} | 🎯 Model: {model_option}"
-                    if enable_translation:
-                        metadata += f" | 🌐 Translated"
-                    st.caption(metadata)
-                    
-                    # Save to session and database
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": final_response,
-                        "metadata": metadata
-                    })
-                    
-                    save_conversation(prompt, final_response, detected_lang, translated_prompt)
+        chat_area(model_option, target_language, enable_translation, show_timings, response_speed)
     
     with col2:
         st.header("🎯 Features")
@@ -190,5 +198,86 @@ def main():
         for lang in languages:
             st.markdown(f"• {lang}")
 
+def show_earlier_messages():
+    st.session_state.chat_window += CHAT_WINDOW
+
+@fragment
+def chat_area(model_option, target_language, enable_translation, show_timings, response_speed):
+    """Chat messages and input; reruns on its own when a message is sent"""
+    client = load_client()
+    
+    # Chat container
+    chat_container = st.container()
+    
+    # Initialize session state
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if "chat_window" not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW
+    
+    # Display the most recent chat messages
+    with chat_container:
+        messages = st.session_state.messages
+        hidden = max(0, len(messages) - st.session_state.chat_window)
+        if hidden:
+            st.button(f"Show {min(hidden, CHAT_WINDOW)} earlier messages ({hidden} hidden)",
+                      on_click=show_earlier_messages)
+        for message in messages[hidden:]:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+                if "metadata" in message:
+                    st.caption(message["metadata"])
+    
+    # Chat input
+    if prompt := st.chat_input("Type your message in any language..."):
+        # Add user message to chat
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        
+        # Process with chatbot, streaming the response as it arrives
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("🤔 Thinking...")
+            final_response = ""
+            result = None
+            try:
+                events = client.stream(prompt, model_option, target_language, enable_translation,
+                                       st.session_state.session_id, show_timings, response_speed)
+                for kind, payload in events:
+                    if kind == "chunk":
+                        final_response += payload
+                        placeholder.markdown(final_response + "▌")
+                    else:
+                        result = payload
+            except Exception as e:
+                st.error(f"Chat error: {str(e)}")
+            
+            if result is not None:
+                final_response = result["response"]
+                placeholder.markdown(final_response)
+                
+                # Show metadata
+                metadata = f"🔍 Detected: {result['detected_language']} | 🎯 Model: {model_option}"
+                if enable_translation:
+                    metadata += f" | 🌐 Translated"
+                if result.get("cached"):
+                    metadata += " | ⚡ Cached"
+                if result.get("deadline_hit"):
+                    metadata += " | ⌛ Cut at time limit"
+                if result.get("timings"):
+                    metadata += " | ⏱️ " + metrics.format_timings(result["timings"])
+                st.caption(metadata)
+                
+                # Save to session (the pipeline stores it in the database)
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": final_response,
+                    "metadata": metadata
+                })
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,98 @@
+import os
+import threading
+import weakref
+
+import metrics
+
+# Small models sharing a tokenizer with the main model, used to propose tokens for it to verify
+DRAFT_MODELS = {
+    "dialogpt": "microsoft/DialoGPT-small",
+    "flan_t5": "google/flan-t5-small",
+}
+
+ASSISTED_DECODING = os.environ.get("CHATBOT_ASSISTED_DECODING", "").lower() in ("1", "true", "yes")
+
+DRAFT_PROPOSED = metrics.REGISTRY.counter("chatbot_draft_tokens_proposed_total", "Tokens proposed by draft models")
+DRAFT_ACCEPTED = metrics.REGISTRY.counter(
+    "chatbot_draft_tokens_accepted_total", "Draft tokens accepted by the main model"
+)
+
+
+class AssistStats:
+    """Acceptance rate of draft tokens per model.
+
+    Forward hooks count main-model passes (one verification round each) and
+    draft passes (one proposed token each) on the calling thread. Every round
+    yields the accepted draft tokens plus one token from the main model, so
+    accepted = generated - rounds.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._hooked = weakref.WeakSet()
+        self._local = threading.local()
+
+    def _hook(self, module):
+        if module in self._hooked:
+            return
+        with self._lock:
+            if module not in self._hooked:
+                module.register_forward_hook(self._count)
+                self._hooked.add(module)
+
+    def _count(self, module, inputs, output):
+        counts = getattr(self._local, "counts", None)
+        if counts is not None and id(module) in counts:
+            counts[id(module)] += 1
+
+    def measure(self, name, model, draft):
+        """Context manager around one assisted generate call; set .generated to the new token count"""
+        self._hook(model)
+        self._hook(draft)
+        return _Measurement(self, name, model, draft)
+
+    def record(self, name, generated, rounds, proposed):
+        accepted = min(proposed, max(0, generated - rounds))
+        DRAFT_PROPOSED.inc(proposed, model=name)
+        DRAFT_ACCEPTED.inc(accepted, model=name)
+        with self._lock:
+            entry = self._models.setdefault(name, {"generations": 0, "tokens": 0, "rounds": 0, "proposed": 0,
+                                                   "accepted": 0})
+            entry["generations"] += 1
+            entry["tokens"] += generated
+            entry["rounds"] += rounds
+            entry["proposed"] += proposed
+            entry["accepted"] += accepted
+
+    def stats(self):
+        """Per model: generations, acceptance rate and tokens produced per main-model pass"""
+        with self._lock:
+            return {
+                name: {
+                    "generations": entry["generations"],
+                    "acceptance_rate": round(entry["accepted"] / entry["proposed"], 3) if entry["proposed"] else 0.0,
+                    "tokens_per_pass": round(entry["tokens"] / entry["rounds"], 2) if entry["rounds"] else 0.0,
+                }
+                for name, entry in self._models.items()
+            }
+
+
+class _Measurement:
+    def __init__(self, stats, name, model, draft):
+        self.stats = stats
+        self.name = name
+        self.model = model
+        self.draft = draft
+        self.generated = 0
+
+    def __enter__(self):
+        self.stats._local.counts = {id(self.model): 0, id(self.draft): 0}
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        counts = self.stats._local.counts
+        self.stats._local.counts = None
+        if exc_type is None and counts[id(self.model)]:
+            self.stats.record(self.name, self.generated, counts[id(self.model)], counts[id(self.draft)])
+        return False
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Run a JSONL file of prompts through the Multi-Language Chatbot pipeline.
+Reads the input in chunks, batches language detection, translation and
+generation per chunk, and streams results to a JSONL output file. A
+checkpoint is written after every chunk so an interrupted run continues
+with --resume instead of starting over, without saving any turn to the
+history database twice.
+
+Usage:
+    python batch_cli.py prompts.jsonl -o replies.jsonl
+    python batch_cli.py prompts.jsonl -o replies.jsonl --resume --save-history
+    python batch_cli.py prompts.jsonl -o replies.jsonl --model "FLAN-T5 (Instruction)" --budget fast
+
+Each input line is a JSON object with "message" and optionally "id", "model",
+"target_language", "translate", "session_id" and "budget"; a plain JSON string
+is taken as the message.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def read_chunks(path, chunk_size, skip=0):
+    """Yield (line number, raw line) chunks of the input, skipping the first `skip` lines"""
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            if number < skip:
+                continue
+            chunk.append((number, line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_record(number, line, defaults):
+    """Turn an input line into a request dict, or an error string"""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return f"invalid JSON: {e}"
+    if isinstance(record, str):
+        record = {"message": record}
+    if not isinstance(record, dict) or not str(record.get("message", "")).strip():
+        return "missing \"message\""
+    request = dict(defaults, **record)
+    request.setdefault("id", number)
+    request["message"] = str(request["message"]).strip()
+    return request
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    """Replace the checkpoint atomically so a crash never leaves a half-written one"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_history(store, rows, timestamp):
+    """Store the answered rows of a chunk under one timestamp, in one transaction"""
+    store.insert_many([
+        (timestamp, row["message"], row["response"], row["detected_language"], row["translated_message"],
+         row["session_id"])
+        for row in rows if "response" in row
+    ])
+
+
+def finish_pending_history(store, checkpoint, output_path):
+    """Insert the chunk a crash interrupted between checkpointing and saving history, unless it was inserted.
+
+    The chunk's rows are read back from the output file; its timestamp tells whether they reached the database.
+    """
+    pending = checkpoint.get("db_pending")
+    if not pending:
+        return
+    if not store.has_timestamp(pending["timestamp"]):
+        with open(output_path, "rb") as f:
+            f.seek(pending["output_start"])
+            data = f.read(checkpoint["output_bytes"] - pending["output_start"])
+        rows = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+        save_history(store, rows, pending["timestamp"])
+    checkpoint["db_pending"] = None
+
+
+def process_chunk(pipeline, requests, executor):
+    """Run one chunk of requests through the pipeline; returns one result per request, in order"""
+    chatbot = pipeline.chatbot
+    results = [None] * len(requests)
+
+    # Detection and translation to English, batched per translation setting
+    prepared = [None] * len(requests)
+    for enable in (True, False):
+        indexes = [i for i, request in enumerate(requests) if bool(request["translate"]) == enable]
+        if indexes:
+            for i, item in zip(indexes, pipeline.prepare_many([requests[i]["message"] for i in indexes], enable)):
+                prepared[i] = item
+
+    # Generation: concurrent requests are grouped into model batches by the scheduler,
+    # while the turns of one session run in order on a single thread
+    def answer(indexes):
+        for i in indexes:
+            request = requests[i]
+            try:
+                results[i] = pipeline.generate(prepared[i][1], request["model"], request.get("session_id"),
+                                               request.get("budget"))
+            except Exception as e:
+                results[i] = e
+
+    groups = {}
+    for i, request in enumerate(requests):
+        session_id = request.get("session_id")
+        groups.setdefault(session_id if session_id is not None else ("request", i), []).append(i)
+    list(executor.map(answer, groups.values()))
+
+    # Translation back, batched per target language
+    responses = [result[0] if isinstance(result, tuple) else None for result in results]
+    targets = {}
+    for i, request in enumerate(requests):
+        if responses[i] is not None and pipeline._wants_translation_back(request["translate"], request["target_language"]):
+            targets.setdefault(request["target_language"], []).append(i)
+    for target, indexes in targets.items():
+        for i, translated in zip(indexes, chatbot.translate_batch([responses[i] for i in indexes], target)):
+            responses[i] = translated
+
+    output = []
+    for i, request in enumerate(requests):
+        detection, translated_message = prepared[i]
+        row = {
+            "id": request["id"],
+            "message": request["message"],
+            "detected_language": detection["name"],
+            "language_code": detection["code"],
+            "confidence": detection["confidence"],
+            "translated_message": translated_message,
+            "model": request["model"],
+            "session_id": request.get("session_id"),
+        }
+        if isinstance(results[i], Exception):
+            row["error"] = str(results[i])
+        else:
+            _, cached, deadline_hit = results[i]
+            row.update(response=responses[i], cached=cached, deadline_hit=deadline_hit)
+        output.append(row)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL file of prompts")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to write results to")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint instead of starting over")
+    parser.add_argument("--chunk-size", type=int, default=64, help="records read, batched and checkpointed together")
+    parser.add_argument("--concurrency", type=int, default=8, help="generation requests in flight per chunk")
+    parser.add_argument("--model", default="DialoGPT (Fast)", help="default model for records without one")
+    parser.add_argument("--target-language", default="auto", help="default response language")
+    parser.add_argument("--no-translate", action="store_true", help="default to no translation")
+    parser.add_argument("--budget", help="default latency tier or seconds (see latency_budget.py)")
+    parser.add_argument("--save-history", action="store_true", help="also store the turns in the history database")
+    parser.add_argument("--db", default="chat_history.db")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint and checkpoint.get("input") != os.path.abspath(args.input):
+        sys.exit(f"❌ {checkpoint_path} belongs to {checkpoint.get('input')}, not {args.input}")
+    checkpoint = checkpoint or {"input": os.path.abspath(args.input), "lines_done": 0, "output_bytes": 0,
+                                "processed": 0, "errors": 0, "db_pending": None}
+
+    from chatbot import MultiLanguageChatbot
+    from pipeline import ChatPipeline
+    from storage import ConversationStore
+
+    store = ConversationStore(args.db) if args.save_history else None
+    pipeline = ChatPipeline(MultiLanguageChatbot(), store)
+    defaults = {
+        "model": args.model,
+        "target_language": args.target_language,
+        "translate": not args.no_translate,
+        "budget": args.budget,
+    }
+
+    print("📦 Multi-Language Chatbot - Batch Processing")
+    print("=" * 50)
+    if checkpoint["lines_done"]:
+        print(f"↩️  Resuming after line {checkpoint['lines_done']} ({checkpoint['processed']} results written)")
+    if store is not None and checkpoint.get("db_pending"):
+        finish_pending_history(store, checkpoint, args.output)
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    # Drop anything written after the last checkpoint; those lines are processed again
+    mode = "r+" if args.resume and os.path.exists(args.output) else "w"
+    start = time.perf_counter()
+    processed_this_run = 0
+    with open(args.output, mode, encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        out.seek(checkpoint["output_bytes"])
+        out.truncate()
+        for chunk in read_chunks(args.input, args.chunk_size, skip=checkpoint["lines_done"]):
+            requests, rows = [], {}
+            for number, line in chunk:
+                if not line.strip():
+                    continue
+                request = parse_record(number, line, defaults)
+                if isinstance(request, str):
+                    rows[number] = {"id": number, "error": request}
+                else:
+                    request["_line"] = number
+                    requests.append(request)
+
+            for request, row in zip(requests, process_chunk(pipeline, requests, executor) if requests else []):
+                rows[request["_line"]] = row
+            ordered = [rows[number] for number in sorted(rows)]
+            output_start = out.tell()
+            out.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in ordered))
+            out.flush()
+            os.fsync(out.fileno())
+
+            checkpoint["lines_done"] = chunk[-1][0] + 1
+            checkpoint["output_bytes"] = out.tell()
+            checkpoint["processed"] += len(ordered)
+            checkpoint["errors"] += sum(1 for row in ordered if "error" in row)
+            if store is not None:
+                # The chunk is checkpointed as pending before it is saved, so a resume can tell
+                # from its timestamp whether the insert happened
+                now = datetime.now().isoformat()
+                checkpoint["db_pending"] = {"timestamp": now, "output_start": output_start}
+                save_checkpoint(checkpoint_path, checkpoint)
+                save_history(store, ordered, now)
+                checkpoint["db_pending"] = None
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            processed_this_run += len(ordered)
+            elapsed = time.perf_counter() - start
+            print(f"⏳ {checkpoint['processed']} done ({checkpoint['errors']} errors) | "
+                  f"{processed_this_run / elapsed:.2f} records/s")
+
+    if store is not None:
+        store.close()
+    elapsed = time.perf_counter() - start
+    print("=" * 50)
+    print(f"✅ {processed_this_run} records in {elapsed:.1f} s → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
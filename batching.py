@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import metrics
+
+
+class MicroBatchScheduler:
+    """Group concurrent requests per key and run them as one batch"""
+
+    def __init__(self, handler, max_batch_size=8, max_wait_ms=20):
+        # handler(key, items) -> list of results, one per item
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queues = {}
+        self._workers = {}
+        self._cond = threading.Condition()
+
+    def submit(self, key, item):
+        """Queue an item and return a Future for its result"""
+        future = Future()
+        with self._cond:
+            queue = self._queues.setdefault(key, deque())
+            queue.append((item, future))
+            metrics.QUEUE_DEPTH.set(len(queue), queue=self._label(key))
+            if key not in self._workers:
+                worker = threading.Thread(target=self._run, args=(key,), daemon=True)
+                self._workers[key] = worker
+                worker.start()
+            self._cond.notify_all()
+        return future
+
+    @staticmethod
+    def _label(key):
+        return "batch_" + str(key[0] if isinstance(key, tuple) else key)
+
+    def run(self, key, item):
+        """Submit an item and block until its batch has been processed"""
+        return self.submit(key, item).result()
+
+    def queue_depth(self, key=None):
+        """Number of requests waiting to be batched"""
+        with self._cond:
+            if key is not None:
+                return len(self._queues.get(key, ()))
+            return sum(len(q) for q in self._queues.values())
+
+    def _collect(self, key):
+        """Wait for the first request, then fill the batch until it is full or the window closes"""
+        queue = self._queues[key]
+        with self._cond:
+            while not queue:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch_size))]
+            metrics.QUEUE_DEPTH.set(len(queue), queue=self._label(key))
+            return batch
+
+    def _run(self, key):
+        while True:
+            batch = self._collect(key)
+            items = [item for item, _ in batch]
+            try:
+                results = self.handler(key, items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
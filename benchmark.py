@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the Multi-Language Chatbot pipeline.
+Replays a JSONL workload through detect -> translate -> generate ->
+translate back -> persist at a chosen concurrency and reports p50/p95/p99
+latency and throughput per stage. Results are written as JSON so runs can
+be diffed with --baseline.
+
+Usage:
+    python benchmark.py --stub                       # offline, stub translation and models
+    python benchmark.py --concurrency 8 --repeat 3   # real models
+    python benchmark.py --stub --baseline old.json   # compare against an earlier run
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STAGES = [
+    "detect_language",
+    "translate_text",
+    "translate_sentences",
+    "generate_response_dialogpt",
+    "generate_response_blenderbot",
+    "generate_response_flan_t5",
+    "save_conversation",
+    "end_to_end",
+]
+
+
+class StageTimer:
+    """Thread-safe collection of per-stage latencies"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, obj, attribute, stage):
+        """Replace obj.attribute with a version that records its duration under stage"""
+        func = getattr(obj, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, attribute, timed)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, wall_seconds):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 3),
+        "p50_ms": round(1000 * percentile(values, 0.50), 3),
+        "p95_ms": round(1000 * percentile(values, 0.95), 3),
+        "p99_ms": round(1000 * percentile(values, 0.99), 3),
+        "max_ms": round(1000 * values[-1], 3),
+        "throughput_per_s": round(len(values) / wall_seconds, 3) if wall_seconds else None,
+    }
+
+
+def install_stubs(chatbot, translate_ms, generate_ms, per_token_ms):
+    """Swap translation and model generation for offline stand-ins with realistic-ish latency"""
+    import chatbot as chatbot_module
+    from translation import TranslationBackend
+
+    class StubTranslationBackend(TranslationBackend):
+        name = "stub"
+
+        def translate_batch(self, texts, target_lang, source_lang=None):
+            time.sleep(translate_ms / 1000)
+            return [f"[{target_lang}] {text}" for text in texts]
+
+    def stub_generate(texts):
+        # One forward pass per batch: fixed cost plus a per-token cost for the longest prompt
+        longest = max(len(text.split()) for text in texts)
+        time.sleep((generate_ms + per_token_ms * longest) / 1000)
+        return [f"Stub reply to: {text[:40]}" for text in texts]
+
+    chatbot_module.TRANSFORMERS_AVAILABLE = True
+    chatbot_module.TRANSLATOR_AVAILABLE = True
+    chatbot.translator = StubTranslationBackend()
+    chatbot.generate_batch_dialogpt = lambda texts, **kwargs: stub_generate(texts)
+    chatbot.generate_batch_blenderbot = lambda texts, **kwargs: stub_generate(texts)
+    chatbot.generate_batch_flan_t5 = lambda texts, **kwargs: stub_generate(texts)
+    chatbot.generate_with_context_dialogpt = lambda text, session_id, *args, **kwargs: stub_generate([text])[0]
+    # There are no real models to load in the background
+    chatbot.prefetch_model = lambda model_choice, warmup=True: False
+
+
+def load_workload(path, repeat, limit):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if limit:
+        records = records[:limit]
+    return records * repeat
+
+
+def run(args):
+    from chatbot import MultiLanguageChatbot
+    from pipeline import ChatPipeline
+    from storage import ConversationStore
+    from translation_cache import TranslationCache
+
+    chatbot = MultiLanguageChatbot()
+    if args.stub:
+        install_stubs(chatbot, args.stub_translate_ms, args.stub_generate_ms, args.stub_per_token_ms)
+    if not args.translation_cache:
+        # Measure real translation cost rather than cache hits
+        chatbot.translation_cache = TranslationCache(db_path=None, max_entries=0)
+
+    db_dir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    store = ConversationStore(os.path.join(db_dir, "bench.db"))
+    pipeline = ChatPipeline(chatbot, store)
+
+    timer = StageTimer()
+    timer.wrap(chatbot, "detect_language_info", "detect_language")
+    timer.wrap(chatbot, "translate_text", "translate_text")
+    timer.wrap(chatbot, "translate_sentences", "translate_sentences")
+    for backend in ("dialogpt", "blenderbot", "flan_t5"):
+        timer.wrap(chatbot, f"generate_response_{backend}", f"generate_response_{backend}")
+    timer.wrap(store, "save", "save_conversation")
+
+    workload = load_workload(args.workload, args.repeat, args.limit)
+
+    def replay(record):
+        start = time.perf_counter()
+        pipeline.process(
+            record["message"],
+            record.get("model", "DialoGPT (Fast)"),
+            record.get("target_language", "auto"),
+            record.get("translate", True),
+            record.get("session_id"),
+            budget=record.get("budget", args.budget),
+        )
+        timer.record("end_to_end", time.perf_counter() - start)
+
+    # Warm up models and caches outside the measured window
+    for record in workload[:args.warmup]:
+        replay(record)
+    timer.samples.clear()
+
+    print(f"🏁 Replaying {len(workload)} requests at concurrency {args.concurrency}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(replay, workload))
+    wall_seconds = time.perf_counter() - start
+
+    flush_start = time.perf_counter()
+    store.close()
+    flush_seconds = time.perf_counter() - flush_start
+
+    return {
+        "config": {
+            "workload": args.workload,
+            "requests": len(workload),
+            "concurrency": args.concurrency,
+            "stub": args.stub,
+            "translation_cache": args.translation_cache,
+            "budget": args.budget,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(workload) / wall_seconds, 3),
+        "store_flush_seconds": round(flush_seconds, 3),
+        "stages": {stage: summarize(timer.samples[stage], wall_seconds) for stage in STAGES if stage in timer.samples},
+        "latency_budget": chatbot.budget_stats.stats(),
+    }
+
+
+def print_report(report, baseline=None):
+    print("\n" + "=" * 78)
+    print(f"{'Stage':<30}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>9}")
+    for stage, stats in report["stages"].items():
+        line = (f"{stage:<30}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                f"{stats['p99_ms']:>10.1f}{stats['throughput_per_s']:>9.1f}")
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old and old["p95_ms"]:
+            change = 100 * (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+            line += f"  p95 {change:+.1f}%"
+        print(line)
+    print("=" * 78)
+    print(f"⏱️  {report['requests_per_second']} requests/s over {report['wall_seconds']} s "
+          f"(history flush {report['store_flush_seconds']} s)")
+    for tier, stats in report.get("latency_budget", {}).items():
+        print(f"⌛ {tier}: mean {stats['mean_seconds']} s of {stats['mean_budget']} s budget "
+              f"(max {stats['max_ratio']:.0%}), {stats['deadline_hits']}/{stats['requests']} hit the deadline")
+    if baseline:
+        change = 100 * (report["requests_per_second"] - baseline["requests_per_second"]) / baseline["requests_per_second"]
+        print(f"📈 Throughput vs baseline: {change:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot pipeline per stage")
+    parser.add_argument("--workload", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "workload.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the workload this many times")
+    parser.add_argument("--limit", type=int, default=0, help="only use the first N workload records")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests run first")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--budget", help="latency tier or seconds for records without their own \"budget\"")
+    parser.add_argument("--translation-cache", action="store_true", help="keep the translation cache enabled")
+    parser.add_argument("--stub", action="store_true", help="use offline stub translation and model backends")
+    parser.add_argument("--stub-translate-ms", type=float, default=150)
+    parser.add_argument("--stub-generate-ms", type=float, default=400)
+    parser.add_argument("--stub-per-token-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    print("📊 Multi-Language Chatbot - Pipeline Benchmark")
+    report = run(args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of tokenization for each chatbot model.
+Compares the original path (slow Python tokenizer, whole prompt tokenized
+per call) with the current one (verified fast tokenizer, pre-encoded prompt
+template, batch encode/decode), and with --generate reports which share of
+a request's model time is spent tokenizing and detokenizing.
+
+Usage:
+    python benchmark_tokenization.py
+    python benchmark_tokenization.py --models flan_t5 --batch-size 8 --generate
+"""
+
+import argparse
+import json
+import os
+import time
+
+# model key -> (hub name, slow tokenizer class, decoder-only)
+MODELS = {
+    "dialogpt": ("microsoft/DialoGPT-medium", "GPT2Tokenizer", True),
+    "blenderbot": ("facebook/blenderbot-400M-distill", "BlenderbotTokenizer", False),
+    "flan_t5": ("google/flan-t5-base", "T5Tokenizer", False),
+}
+
+
+def load_messages(path, limit):
+    messages = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                messages.append(json.loads(line)["message"])
+    return messages[:limit] if limit else messages
+
+
+def mean_ms(func, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = func()
+    return 1000 * (time.perf_counter() - start) / runs, result
+
+
+def prompt_format(model_key, tokenizer):
+    from chatbot import FLAN_T5_PREFIX
+    if model_key == "dialogpt":
+        return "", tokenizer.eos_token
+    if model_key == "flan_t5":
+        return FLAN_T5_PREFIX, ""
+    return "", ""
+
+
+def measure(model_key, batches, runs, generate):
+    import torch
+    import transformers
+    from tokenization import PromptTemplate, equivalence_report, load_tokenizer
+
+    model_name, slow_class, decoder_only = MODELS[model_key]
+    slow = getattr(transformers, slow_class).from_pretrained(model_name)
+    fast = load_tokenizer(model_name, getattr(transformers, slow_class))
+    for tokenizer in (slow, fast):
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+    prefix, suffix = prompt_format(model_key, fast)
+    template = PromptTemplate(fast, prefix, suffix)
+    truncation = not decoder_only
+
+    model = None
+    if generate:
+        model_class = transformers.AutoModelForCausalLM if decoder_only else transformers.AutoModelForSeq2SeqLM
+        model = model_class.from_pretrained(model_name).eval()
+
+    result = {"fast": fast.is_fast, "template_exact": template.exact,
+              "mismatches": equivalence_report().get(model_name, {}).get("mismatches", [])}
+    for label in ("before", "after"):
+        encode_ms = decode_ms = generate_ms = 0.0
+        for batch in batches:
+            if label == "before":
+                prompts = [prefix + text + suffix for text in batch]
+                ms, inputs = mean_ms(lambda: slow(prompts, return_tensors="pt", padding=True,
+                                                  truncation=truncation), runs)
+            else:
+                ms, inputs = mean_ms(lambda: template.encode_batch(batch, truncation=truncation), runs)
+            encode_ms += ms
+
+            outputs = inputs.input_ids
+            if model is not None:
+                start = time.perf_counter()
+                with torch.no_grad():
+                    outputs = model.generate(**inputs, num_beams=1, do_sample=False, max_new_tokens=40,
+                                             pad_token_id=fast.pad_token_id)
+                generate_ms += 1000 * (time.perf_counter() - start)
+                if decoder_only:
+                    outputs = outputs[:, inputs.input_ids.shape[-1]:]
+
+            if label == "before":
+                ms, _ = mean_ms(lambda: slow.batch_decode(outputs, skip_special_tokens=True), runs)
+            else:
+                ms, _ = mean_ms(lambda: template.decode_batch(outputs), runs)
+            decode_ms += ms
+
+        requests = sum(len(batch) for batch in batches)
+        entry = {
+            "encode_ms_per_request": round(encode_ms / requests, 3),
+            "decode_ms_per_request": round(decode_ms / requests, 3),
+        }
+        if model is not None:
+            total = encode_ms + generate_ms + decode_ms
+            entry["generate_ms_per_request"] = round(generate_ms / requests, 1)
+            entry["tokenization_share"] = round((encode_ms + decode_ms) / total, 4)
+        result[label] = entry
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", default=",".join(MODELS))
+    parser.add_argument("--workload", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "benchmarks", "workload.jsonl"))
+    parser.add_argument("--limit", type=int, default=0, help="use only the first N messages")
+    parser.add_argument("--batch-size", type=int, default=1, help="messages encoded together")
+    parser.add_argument("--runs", type=int, default=20, help="repetitions of each encode/decode")
+    parser.add_argument("--generate", action="store_true",
+                        help="also load the models and report tokenization's share of request time")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    messages = load_messages(args.workload, args.limit)
+    batches = [messages[i:i + args.batch_size] for i in range(0, len(messages), args.batch_size)]
+
+    print("🔤 Multi-Language Chatbot - Tokenization Benchmark")
+    print("=" * 50)
+    report = {}
+    for model_key in args.models.split(","):
+        print(f"🔄 {model_key}...")
+        report[model_key] = measure(model_key, batches, args.runs, args.generate)
+
+    print("\n" + "=" * 50)
+    print(f"{'Model':<12}{'Path':<8}{'Encode ms':>11}{'Decode ms':>11}{'Share':>9}")
+    for model_key, result in report.items():
+        for label in ("before", "after"):
+            entry = result[label]
+            share = f"{entry['tokenization_share']:.1%}" if "tokenization_share" in entry else "-"
+            print(f"{model_key:<12}{label:<8}{entry['encode_ms_per_request']:>11.3f}"
+                  f"{entry['decode_ms_per_request']:>11.3f}{share:>9}")
+        if not result["fast"] or not result["template_exact"]:
+            print(f"⚠️  {model_key}: fast tokenizer {'on' if result['fast'] else 'off'}, "
+                  f"template {'exact' if result['template_exact'] else 'falls back to full tokenization'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
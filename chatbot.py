@@ -1,43 +1,129 @@
 import streamlit as st
 import warnings
 import logging
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from batching import MicroBatchScheduler
+from conversation_context import ContextStore
+from translation_cache import TranslationCache
+from response_cache import ResponseCache
+from semantic_index import SEMANTIC_INDEX_AVAILABLE, SemanticIndex
+from latency_budget import DECODING_TIERS, BudgetStats, resolve_tier
+from assisted_decoding import ASSISTED_DECODING, DRAFT_MODELS, AssistStats
+from worker_pool import InferenceWorkerPool
+from language_detection import LANGDETECT_AVAILABLE, LanguageDetector
+from model_registry import ModelRegistry
+from inference_modes import DEFAULT_INFERENCE_MODE, apply_inference_mode, load_onnx_model, load_pretrained
+from translation import GOOGLETRANS_AVAILABLE, LOCAL_TRANSLATION_AVAILABLE, create_translation_backend
+from tokenization import PromptTemplate, equivalence_report, load_tokenizer
+from lazy_imports import lazy_import, module_available
 
-# Try to import dependencies with fallbacks
-try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM, BlenderbotTokenizer, BlenderbotForConditionalGeneration
-    from transformers import T5Tokenizer, T5ForConditionalGeneration
-    import torch
-    TRANSFORMERS_AVAILABLE = True
-except ImportError as e:
-    st.error(f"⚠️ Transformers not installed: {e}")
+# transformers and torch take seconds to import, so they are only loaded when a model is first needed
+transformers = lazy_import("transformers")
+torch = lazy_import("torch")
+TRANSFORMERS_AVAILABLE = module_available("transformers", "torch")
+if not TRANSFORMERS_AVAILABLE:
+    st.error("⚠️ Transformers not installed")
     st.info("Please install dependencies by running: pip install transformers torch")
-    TRANSFORMERS_AVAILABLE = False
 
-try:
-    from langdetect import detect, DetectorFactory
-    LANGDETECT_AVAILABLE = True
-    DetectorFactory.seed = 0
-except ImportError:
+if not LANGDETECT_AVAILABLE:
     st.error("⚠️ Language detection not available. Install with: pip install langdetect")
-    LANGDETECT_AVAILABLE = False
 
-try:
-    from googletrans import Translator
-    TRANSLATOR_AVAILABLE = True
-except ImportError:
-    st.error("⚠️ Translation not available. Install with: pip install googletrans==4.0.0rc1")
-    TRANSLATOR_AVAILABLE = False
+TRANSLATION_BACKEND = os.environ.get("CHATBOT_TRANSLATION_BACKEND", "google")
+if TRANSLATION_BACKEND not in ("google", "local"):
+    st.warning(f"⚠️ Unknown CHATBOT_TRANSLATION_BACKEND {TRANSLATION_BACKEND!r}; using \"google\" instead")
+    TRANSLATION_BACKEND = "google"
+if TRANSLATION_BACKEND == "local":
+    TRANSLATOR_AVAILABLE = LOCAL_TRANSLATION_AVAILABLE
+    if not TRANSLATOR_AVAILABLE:
+        st.error("⚠️ Offline translation not available. Install with: pip install transformers torch sentencepiece")
+else:
+    TRANSLATOR_AVAILABLE = GOOGLETRANS_AVAILABLE
+    if not TRANSLATOR_AVAILABLE:
+        st.error("⚠️ Translation not available. Install with: pip install googletrans==4.0.0rc1")
+
+# "deterministic" turns off sampling so identical prompts get identical, cacheable replies
+DETERMINISTIC_DECODING = os.environ.get("CHATBOT_DECODING", "sample") == "deterministic"
+
+# Instruction FLAN-T5 answers; encoded once per tokenizer and reused for every message
+FLAN_T5_PREFIX = "Answer this question or respond to this statement: "
+
+# Replies that report a failure rather than come from a model; never cached
+ERROR_PREFIXES = ("Sorry, I encountered an error", "Sorry, I'm having trouble loading the model")
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
-if TRANSFORMERS_AVAILABLE:
-    logging.getLogger("transformers").setLevel(logging.ERROR)
+logging.getLogger("transformers").setLevel(logging.ERROR)
 
 class MultiLanguageChatbot:
     def __init__(self):
-        self.translator = Translator() if TRANSLATOR_AVAILABLE else None
+        self.language_detector = LanguageDetector(cache_size=int(os.environ.get("CHATBOT_DETECTION_CACHE_SIZE", 2048)))
+        self.translator = create_translation_backend(TRANSLATION_BACKEND, detect=self._detect_code) if TRANSLATOR_AVAILABLE else None
+        self.translation_cache = TranslationCache(
+            db_path=os.environ.get("CHATBOT_TRANSLATION_CACHE_DB", "translation_cache.db"),
+            max_entries=int(os.environ.get("CHATBOT_TRANSLATION_CACHE_SIZE", 4096)),
+            ttl_seconds=float(os.environ.get("CHATBOT_TRANSLATION_CACHE_TTL", 7 * 24 * 3600))
+        )
         self.models = {}
         self.tokenizers = {}
+        self._templates = {}
+        
+        # Actual generation time against each request's latency budget
+        self.budget_stats = BudgetStats()
+        
+        # Draft token acceptance when assisted decoding is on
+        self.assist_stats = AssistStats()
+        
+        # Replies are only cached when decoding is deterministic
+        self.deterministic = DETERMINISTIC_DECODING
+        self.response_cache = ResponseCache(
+            db_path=os.environ.get("CHATBOT_RESPONSE_CACHE_DB") or None,
+            max_entries=int(os.environ.get("CHATBOT_RESPONSE_CACHE_SIZE", 1024))
+        ) if self.deterministic else None
+        
+        # Answers to earlier questions, reused for new questions that mean the same
+        index_dir = os.environ.get("CHATBOT_SEMANTIC_INDEX")
+        self.semantic_index = SemanticIndex(
+            index_dir, threshold=float(os.environ.get("CHATBOT_SEMANTIC_THRESHOLD", 0.95)),
+            max_entries=int(os.environ.get("CHATBOT_SEMANTIC_MAX_ENTRIES", 50000))
+        ) if index_dir and SEMANTIC_INDEX_AVAILABLE else None
+        
+        # Loaded models live in a registry that keeps them within a memory budget
+        budget = os.environ.get("CHATBOT_MODEL_MEMORY_BUDGET_MB", "2048")
+        self.registry = ModelRegistry(
+            {
+                "dialogpt": self._load_dialogpt_model,
+                "blenderbot": self._load_blenderbot_model,
+                "flan_t5": self._load_flan_t5_model,
+                "dialogpt_draft": lambda mode: self._load_draft_model("dialogpt", mode),
+                "flan_t5_draft": lambda mode: self._load_draft_model("flan_t5", mode),
+            },
+            memory_budget_mb=float(budget) if budget else None
+        )
+        
+        # Off-critical-path work: response cache writes and background model loads
+        self.background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chatbot-background")
+        self._prefetching = set()
+        self._prefetch_lock = threading.Lock()
+        
+        # Requests from all sessions share the cached models, so batch them per model
+        self.scheduler = MicroBatchScheduler(
+            self._run_batch,
+            max_batch_size=int(os.environ.get("CHATBOT_MAX_BATCH_SIZE", 8)),
+            max_wait_ms=float(os.environ.get("CHATBOT_MAX_BATCH_WAIT_MS", 20))
+        )
+        
+        # DialoGPT conversation history per chat session, bounded by a token budget
+        self.contexts = ContextStore(
+            max_sessions=int(os.environ.get("CHATBOT_MAX_SESSIONS", 256)),
+            max_tokens=int(os.environ.get("CHATBOT_CONTEXT_TOKENS", 512)),
+            max_cached_tokens=int(os.environ.get("CHATBOT_CONTEXT_CACHE_TOKENS", 2048))
+        )
         
         # Language code mapping
         self.lang_codes = {
@@ -46,56 +132,112 @@ class MultiLanguageChatbot:
             'japanese': 'ja', 'korean': 'ko', 'arabic': 'ar', 'hindi': 'hi'
         }
         
+        # Optionally run generation in worker processes, each with its own cores and model replica
+        workers = int(os.environ.get("CHATBOT_INFERENCE_WORKERS", 0))
+        prewarm = [name.strip() for name in os.environ.get("CHATBOT_PREWARM_MODELS", "").split(",") if name.strip()]
+        self.worker_pool = None
+        
         # Check if all dependencies are available
         if not TRANSFORMERS_AVAILABLE:
             st.error("🚨 AI models not available. Please install transformers and torch.")
+        elif workers > 0:
+            threads = os.environ.get("CHATBOT_WORKER_THREADS")
+            self.worker_pool = InferenceWorkerPool(workers, int(threads) if threads else None, prewarm=prewarm)
+        elif prewarm:
+            # Load and warm up models in the background so the first user skips the cold start
+            self.registry.prewarm(prewarm, DEFAULT_INFERENCE_MODE, warmup=self.warmup_model)
         if not LANGDETECT_AVAILABLE:
             st.warning("⚠️ Language detection not available.")
         if not TRANSLATOR_AVAILABLE:
             st.warning("⚠️ Translation not available.")
     
+    # Map common language codes to readable names
+    LANGUAGE_NAMES = {
+        'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German',
+        'it': 'Italian', 'pt': 'Portuguese', 'ru': 'Russian', 'zh': 'Chinese',
+        'ja': 'Japanese', 'ko': 'Korean', 'ar': 'Arabic', 'hi': 'Hindi'
+    }
+    
     def detect_language(self, text):
         """Detect the language of input text"""
         if not LANGDETECT_AVAILABLE:
             return "English (detection unavailable)"
-        
-        try:
-            detected = detect(text)
-            # Map common language codes to readable names
-            lang_map = {
-                'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German',
-                'it': 'Italian', 'pt': 'Portuguese', 'ru': 'Russian', 'zh-cn': 'Chinese',
-                'ja': 'Japanese', 'ko': 'Korean', 'ar': 'Arabic', 'hi': 'Hindi'
-            }
-            return lang_map.get(detected, detected.upper())
-        except:
-            return "Unknown"
-    
-    def translate_text(self, text, target_lang):
+        return self.detect_language_info(text)["name"]
+    
+    def detect_language_info(self, text):
+        """Detect the language of input text with its code and a confidence between 0 and 1"""
+        with metrics.span("detect_language"):
+            return self.detect_languages([text])[0]
+    
+    def detect_languages(self, texts):
+        """Detect the language of several texts at once"""
+        results = []
+        for code, confidence in self.language_detector.detect_languages(texts):
+            name = "Unknown" if code == 'unknown' else self.LANGUAGE_NAMES.get(code, code.upper())
+            results.append({"code": code, "name": name, "confidence": confidence})
+        return results
+    
+    def is_confidently_english(self, info, threshold=0.9):
+        """True when a detection result is English with enough confidence to skip translation"""
+        return info["code"] == 'en' and info["confidence"] >= threshold
+    
+    def _detect_code(self, text):
+        """Detect the language code of text for translation backends that need a source language"""
+        code, _ = self.language_detector.detect(text)
+        return 'en' if code == 'unknown' else code
+    
+    def translate_text(self, text, target_lang, source_lang=None):
         """Translate text to target language"""
+        return self.translate_batch([text], target_lang, source_lang)[0]
+    
+    def translate_sentences(self, text, target_lang):
+        """Translate a reply one sentence at a time, so the sentences are translated in parallel and cached separately"""
+        sentences = [sentence for sentence in re.split(r'(?<=[.!?。！？])\s+', text.strip()) if sentence]
+        if len(sentences) < 2:
+            return self.translate_text(text, target_lang)
+        return " ".join(self.translate_batch(sentences, target_lang))
+    
+    def translate_batch(self, texts, target_lang, source_lang=None):
+        """Translate several texts to target language in one backend call"""
         if not TRANSLATOR_AVAILABLE or self.translator is None:
-            return text  # Return original text if translation not available
+            return list(texts)  # Return original text if translation not available
         
         try:
             if target_lang in self.lang_codes:
                 target_lang = self.lang_codes[target_lang]
+            source_key = source_lang or 'auto'
             
-            result = self.translator.translate(text, dest=target_lang)
-            return result.text
+            with metrics.span("translate"):
+                results = [self.translation_cache.get(text, source_key, target_lang) for text in texts]
+                missing = [i for i, result in enumerate(results) if result is None]
+                metrics.CACHE_HITS.inc(len(texts) - len(missing), cache="translation")
+                metrics.CACHE_MISSES.inc(len(missing), cache="translation")
+                if missing:
+                    translated = self.translator.translate_batch([texts[i] for i in missing], target_lang, source_lang)
+                    for i, result in zip(missing, translated):
+                        self.translation_cache.put(texts[i], source_key, target_lang, result)
+                        results[i] = result
+            return results
         except Exception as e:
             st.error(f"Translation error: {str(e)}")
-            return text
+            return list(texts)
     
-    @st.cache_resource
-    def load_dialogpt_model(_self):
-        """Load DialoGPT model"""
+    def load_dialogpt_model(self, mode=DEFAULT_INFERENCE_MODE):
+        """Load DialoGPT model in the given inference mode (fp32, int8, bf16 or onnx)"""
+        return self.registry.get("dialogpt", mode)
+    
+    def _load_dialogpt_model(self, mode):
+        """Load DialoGPT weights from the Hugging Face hub (called by the model registry)"""
         if not TRANSFORMERS_AVAILABLE:
             return None, None
             
         try:
             model_name = "microsoft/DialoGPT-medium"
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForCausalLM.from_pretrained(model_name)
+            tokenizer = load_tokenizer(model_name, transformers.GPT2Tokenizer)
+            if mode == "onnx":
+                model = load_onnx_model(model_name)
+            else:
+                model = apply_inference_mode(load_pretrained(transformers.AutoModelForCausalLM, model_name, mode), mode)
             
             # Add padding token
             if tokenizer.pad_token is None:
@@ -106,109 +248,562 @@ class MultiLanguageChatbot:
             st.error(f"Error loading DialoGPT: {str(e)}")
             return None, None
     
-    @st.cache_resource
-    def load_blenderbot_model(_self):
-        """Load BlenderBot model"""
+    def load_blenderbot_model(self, mode=DEFAULT_INFERENCE_MODE):
+        """Load BlenderBot model in the given inference mode (fp32, int8, bf16 or onnx)"""
+        return self.registry.get("blenderbot", mode)
+    
+    def _load_blenderbot_model(self, mode):
+        """Load BlenderBot weights from the Hugging Face hub (called by the model registry)"""
         if not TRANSFORMERS_AVAILABLE:
             return None, None
             
         try:
             model_name = "facebook/blenderbot-400M-distill"
-            tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
-            model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+            tokenizer = load_tokenizer(model_name, transformers.BlenderbotTokenizer)
+            if mode == "onnx":
+                model = load_onnx_model(model_name, seq2seq=True)
+            else:
+                model = apply_inference_mode(load_pretrained(transformers.BlenderbotForConditionalGeneration, model_name, mode), mode)
             return tokenizer, model
         except Exception as e:
             st.error(f"Error loading BlenderBot: {str(e)}")
             return None, None
     
-    @st.cache_resource
-    def load_flan_t5_model(_self):
-        """Load FLAN-T5 model"""
+    def load_flan_t5_model(self, mode=DEFAULT_INFERENCE_MODE):
+        """Load FLAN-T5 model in the given inference mode (fp32, int8, bf16 or onnx)"""
+        return self.registry.get("flan_t5", mode)
+    
+    def _load_flan_t5_model(self, mode):
+        """Load FLAN-T5 weights from the Hugging Face hub (called by the model registry)"""
         if not TRANSFORMERS_AVAILABLE:
             return None, None
             
         try:
             model_name = "google/flan-t5-base"
-            tokenizer = T5Tokenizer.from_pretrained(model_name)
-            model = T5ForConditionalGeneration.from_pretrained(model_name)
+            tokenizer = load_tokenizer(model_name, transformers.T5Tokenizer)
+            if mode == "onnx":
+                model = load_onnx_model(model_name, seq2seq=True)
+            else:
+                model = apply_inference_mode(load_pretrained(transformers.T5ForConditionalGeneration, model_name, mode), mode)
             return tokenizer, model
         except Exception as e:
             st.error(f"Error loading FLAN-T5: {str(e)}")
             return None, None
     
-    def generate_response_dialogpt(self, text, max_length=100):
-        """Generate response using DialoGPT"""
+    def _load_draft_model(self, name, mode):
+        """Load the small draft model that proposes tokens for name (called by the model registry)"""
+        if not TRANSFORMERS_AVAILABLE:
+            return None, None
+        
         try:
-            tokenizer, model = self.load_dialogpt_model()
-            if tokenizer is None or model is None:
-                return "Sorry, I'm having trouble loading the model. Please try again."
-            
-            # Encode input
-            input_ids = tokenizer.encode(text + tokenizer.eos_token, return_tensors='pt')
-            
-            # Generate response
-            with torch.no_grad():
-                chat_history_ids = model.generate(
-                    input_ids,
-                    max_length=input_ids.shape[-1] + max_length,
-                    num_beams=5,
-                    no_repeat_ngram_size=2,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=tokenizer.eos_token_id
-                )
+            model_name = DRAFT_MODELS[name]
+            if name == "flan_t5":
+                model_class = transformers.T5ForConditionalGeneration
+            else:
+                model_class = transformers.AutoModelForCausalLM
+            model = load_pretrained(model_class, model_name, mode)
+            # The main model's tokenizer is shared, so no tokenizer is loaded
+            return None, apply_inference_mode(model, mode)
+        except Exception as e:
+            st.error(f"Error loading draft model for {name}: {str(e)}")
+            return None, None
+    
+    def _template(self, name, tokenizer):
+        """The prompt format of a model, with its constant parts pre-encoded for this tokenizer"""
+        template = self._templates.get(name)
+        if template is None or template.tokenizer is not tokenizer:
+            if name == "dialogpt":
+                prefix, suffix = "", tokenizer.eos_token
+            elif name == "flan_t5":
+                prefix, suffix = FLAN_T5_PREFIX, ""
+            else:
+                prefix, suffix = "", ""
+            template = self._templates[name] = PromptTemplate(tokenizer, prefix, suffix)
+        return template
+    
+    def _draft_for(self, name, tier, single_beam=False):
+        """The draft model to assist name's generation with, or None when assisted decoding does not apply"""
+        if not ASSISTED_DECODING or name not in DRAFT_MODELS or DEFAULT_INFERENCE_MODE == "onnx":
+            return None
+        # Assisted generation verifies a single sequence, so it cannot be combined with beam search
+        if tier.num_beams > 1 and not single_beam:
+            return None
+        # A model and its draft are one unit: loading the draft must not evict the model it assists,
+        # and when the two do not fit the budget together the draft is not used
+        main, assistant = (name, DEFAULT_INFERENCE_MODE), (f"{name}_draft", DEFAULT_INFERENCE_MODE)
+        if self.registry.fits(main, assistant):
+            _, draft = self.registry.get(*assistant, keep=[main])
+            # The first load is what tells the draft's size
+            if self.registry.fits(main, assistant):
+                return draft
+        self.registry.evict(*assistant, reason="budget")
+        return None
+    
+    def _generate(self, name, model, tier, single_beam=False, **gen_kwargs):
+        """model.generate with the tier's decoding settings, assisted by a draft model when enabled"""
+        gen_kwargs.update(self._decoding_kwargs(tier, single_beam))
+        draft = self._draft_for(name, tier, single_beam) if gen_kwargs["input_ids"].shape[0] == 1 else None
+        if draft is None:
+            return model.generate(**gen_kwargs)
+        
+        with self.assist_stats.measure(name, model, draft) as measurement:
+            outputs = model.generate(assistant_model=draft, **gen_kwargs)
+            sequences = outputs.sequences if hasattr(outputs, "sequences") else outputs
+            # Decoder-only outputs start with the prompt; encoder-decoder outputs with one start token
+            prompt_length = 1 if model.config.is_encoder_decoder else gen_kwargs["input_ids"].shape[-1]
+            measurement.generated = sequences.shape[-1] - prompt_length
+        return outputs
+    
+    def warmup_model(self, name):
+        """Run one dummy generation so lazy initialisation happens before real traffic"""
+        if name.endswith("_draft"):
+            # Draft models are only run through their main model's generate
+            return
+        tier = resolve_tier()
+        key = ("dialogpt", tier.max_new_tokens, tier.name) if name == "dialogpt" else (name, tier.name)
+        self._run_batch(key, [("Hello", None)])
+    
+    def generate_response_dialogpt(self, text, max_length=100, session_id=None, tier=None, deadline=None):
+        """Generate response using DialoGPT"""
+        tier = tier or resolve_tier()
+        max_length = min(max_length, tier.max_new_tokens)
+        if session_id is not None:
+            try:
+                return self.generate_with_context_dialogpt(text, session_id, max_length, tier=tier, deadline=deadline)
+            except Exception as e:
+                return f"Sorry, I encountered an error: {str(e)}"
+        return self._generate_batched(("dialogpt", max_length, tier.name), text, deadline)
+    
+    def generate_with_context_dialogpt(self, text, session_id, max_length=100, streamer=None, tier=None,
+                                       deadline=None):
+        """Generate a DialoGPT reply that continues the session's conversation.
+        
+        The session keeps its token history and the model's past key/values, so a
+        new turn only runs the model over its own tokens. When the history outgrows
+        the token budget the oldest turns are dropped and the cache is rebuilt.
+        """
+        tokenizer, model = self.load_dialogpt_model()
+        if tokenizer is None or model is None:
+            return "Sorry, I'm having trouble loading the model. Please try again."
+        
+        template = self._template("dialogpt", tokenizer)
+        context = self.contexts.get(session_id)
+        with context.lock:
+            new_ids = template.encode(text)
+            input_ids = torch.tensor([context.prepare(new_ids, reserve=max_length)])
             
-            # Decode response
-            response = tokenizer.decode(chat_history_ids[:, input_ids.shape[-1]:][0], skip_special_tokens=True)
-            return response.strip() if response.strip() else "I'm not sure how to respond to that. Could you try rephrasing?"
+            try:
+                with torch.no_grad():
+                    # Extend the cache over every new token but the last; generate feeds that one
+                    past = context.past_key_values
+                    uncached = input_ids[:, context.cached_length:-1]
+                    if uncached.shape[-1] > 0:
+                        past = model(input_ids=uncached, past_key_values=past, use_cache=True).past_key_values
+                    
+                    # Beam search cannot reuse a single-sequence cache, so decode with one beam
+                    start = time.perf_counter()
+                    outputs = self._generate(
+                        "dialogpt", model, tier or resolve_tier(), single_beam=True,
+                        input_ids=input_ids,
+                        attention_mask=torch.ones_like(input_ids),
+                        past_key_values=past,
+                        max_length=input_ids.shape[-1] + max_length,
+                        max_time=self._time_left(deadline),
+                        no_repeat_ngram_size=2,
+                        pad_token_id=tokenizer.eos_token_id,
+                        return_dict_in_generate=True,
+                        streamer=streamer
+                    )
+            except Exception:
+                # A DynamicCache is extended in place, so it may now run past cached_length
+                context.invalidate_cache()
+                raise
             
-        except Exception as e:
-            return f"Sorry, I encountered an error: {str(e)}"
+            self._record_generation(
+                "dialogpt", outputs.sequences.shape[-1] - input_ids.shape[-1], time.perf_counter() - start
+            )
+            sequence = outputs.sequences[0].tolist()
+            if sequence[-1] != tokenizer.eos_token_id:
+                # Close the bot turn so the next message starts a fresh one
+                sequence.append(tokenizer.eos_token_id)
+            # The returned cache covers every generated token except the last
+            context.commit(sequence, outputs.past_key_values, outputs.sequences.shape[-1] - 1)
+        # Other sessions give up their caches when this one pushed the total over budget
+        self.contexts.enforce_cache_budget()
+        
+        response = template.decode(outputs.sequences[0, input_ids.shape[-1]:])
+        return response.strip() if response.strip() else "I'm not sure how to respond to that. Could you try rephrasing?"
+    
+    def reset_context(self, session_id):
+        """Forget the conversation history of a chat session"""
+        self.contexts.reset(session_id)
+        if self.worker_pool is not None:
+            self.worker_pool.reset(session_id)
     
-    def generate_response_blenderbot(self, text):
+    def generate_response_blenderbot(self, text, tier=None, deadline=None):
         """Generate response using BlenderBot"""
+        return self._generate_batched(("blenderbot", (tier or resolve_tier()).name), text, deadline)
+    
+    def generate_response_flan_t5(self, text, tier=None, deadline=None):
+        """Generate response using FLAN-T5"""
+        return self._generate_batched(("flan_t5", (tier or resolve_tier()).name), text, deadline)
+    
+    def _decoding_kwargs(self, tier, single_beam=False):
+        """generate settings for a decoding tier; never samples in deterministic mode"""
+        kwargs = dict(num_beams=1 if single_beam else tier.num_beams)
+        if self.deterministic or not tier.do_sample:
+            kwargs.update(do_sample=False)
+        else:
+            kwargs.update(temperature=0.7, do_sample=True)
+        return kwargs
+    
+    @staticmethod
+    def _time_left(deadline):
+        """Seconds until a time.monotonic() deadline, for generate's max_time (None means no deadline)"""
+        if deadline is None:
+            return None
+        return max(0.01, deadline - time.monotonic())
+    
+    def cached_response(self, text, model_choice="DialoGPT (Fast)", session_id=None, streaming=False, budget=None):
+        """Look up a reply in the response cache.
+        
+        Returns (key, response). key is None when caching does not apply and
+        response is None on a miss; pass the key to cache_response once the
+        reply has been generated. A hit on a session also adds the turn to the
+        session's history so the conversation carries on from it.
+        """
+        if self.response_cache is None or not TRANSFORMERS_AVAILABLE:
+            return None, None
+        
+        tier = resolve_tier(budget)
+        if "BlenderBot" in model_choice:
+            model_name, beams = "blenderbot", 1 if streaming else tier.num_beams
+        elif "FLAN-T5" in model_choice:
+            model_name, beams = "flan_t5", 1 if streaming else tier.num_beams
+        else:
+            model_name, beams = "dialogpt", 1 if streaming or session_id is not None else tier.num_beams
+        
+        context_hash = ""
+        if model_name == "dialogpt" and session_id is not None:
+            if self.worker_pool is not None:
+                # The session's history lives in a worker process, so it cannot be hashed here
+                return None, None
+            context = self.contexts.get(session_id)
+            with context.lock:
+                context_hash = hashlib.sha1(str(context.token_ids).encode()).hexdigest()
+        
+        key = self.response_cache.make_key(
+            model_name, text, f"tier={tier.name},beams={beams},max_new_tokens={tier.max_new_tokens},mode={DEFAULT_INFERENCE_MODE}", context_hash
+        )
+        with metrics.span("response_cache"):
+            response = self.response_cache.get(key)
+        if response is None:
+            metrics.CACHE_MISSES.inc(cache="response")
+            return key, None
+        
+        metrics.CACHE_HITS.inc(cache="response")
+        if context_hash:
+            self._append_turn(session_id, text, response)
+        return key, response
+    
+    def cache_response(self, key, response):
+        """Store a freshly generated reply under a key from cached_response, writing it in the background"""
+        if key is not None and response and not response.startswith(ERROR_PREFIXES):
+            self.background.submit(self.response_cache.put, key, response)
+    
+    def similar_answer(self, text, model_choice="DialoGPT (Fast)", session_id=None, budget=None):
+        """A stored answer to an earlier question similar to text, generated at the same latency tier, or None.
+        
+        Not used for DialoGPT session turns, whose reply depends on the conversation.
+        """
+        name = self._model_name(model_choice)
+        if self.semantic_index is None or (name == "dialogpt" and session_id is not None):
+            return None
+        return self.semantic_index.lookup(text, name, resolve_tier(budget).name)
+    
+    def index_answer(self, text, response, model_choice="DialoGPT (Fast)", session_id=None, budget=None):
+        """Add a freshly generated answer to the semantic index in the background"""
+        name = self._model_name(model_choice)
+        if (self.semantic_index is None or (name == "dialogpt" and session_id is not None)
+                or not response or response.startswith(ERROR_PREFIXES)):
+            return
+        self.background.submit(self.semantic_index.add, text, response, name, resolve_tier(budget).name)
+    
+    @staticmethod
+    def _model_name(model_choice):
+        """Registry name of the model behind a UI model choice"""
+        if "BlenderBot" in model_choice:
+            return "blenderbot"
+        if "FLAN-T5" in model_choice:
+            return "flan_t5"
+        return "dialogpt"
+    
+    def prefetch_model(self, model_choice, warmup=True):
+        """Start loading (and warming up) a model in the background; returns False if there is nothing to do"""
+        if not TRANSFORMERS_AVAILABLE or self.worker_pool is not None:
+            return False
+        name = self._model_name(model_choice)
+        names = [name]
+        if ASSISTED_DECODING and name in DRAFT_MODELS:
+            names.append(f"{name}_draft")
+        with self._prefetch_lock:
+            if name in self._prefetching or self.registry.is_loaded(name, DEFAULT_INFERENCE_MODE):
+                return False
+            self._prefetching.add(name)
+        
+        def run():
+            try:
+                self.registry.prewarm(names, DEFAULT_INFERENCE_MODE, warmup=self.warmup_model if warmup else None,
+                                      background=False)
+            finally:
+                with self._prefetch_lock:
+                    self._prefetching.discard(name)
+        
+        self.background.submit(run)
+        return True
+    
+    def status(self):
+        """Loaded models, recent model events and per-feature stats, as shown by GET /models and the sidebar"""
+        return {
+            "memory": self.registry.memory_usage(),
+            "events": self.registry.recent_events(),
+            "latency_budget": self.budget_stats.stats(),
+            "assisted_decoding": self.assist_stats.stats(),
+            "workers": self.worker_pool.stats() if self.worker_pool is not None else [],
+            "tokenizers": equivalence_report(),
+            "semantic_index": self.semantic_index.stats() if self.semantic_index is not None else None,
+        }
+    
+    def _append_turn(self, session_id, text, response):
+        """Add a turn answered from the cache to a session's token history"""
+        tokenizer, _ = self.load_dialogpt_model()
+        if tokenizer is None:
+            return
+        context = self.contexts.get(session_id)
+        with context.lock:
+            new_ids, reply_ids = self._template("dialogpt", tokenizer).encode_many([text, response])
+            sequence = context.prepare(new_ids, reserve=len(reply_ids)) + reply_ids
+            # The model cache still covers the unchanged prefix (prepare drops it if it truncated)
+            context.commit(sequence, context.past_key_values, context.cached_length)
+    
+    def _record_generation(self, model_name, tokens, seconds):
+        """Count generated tokens and generation speed for the metrics endpoint"""
+        metrics.TOKENS_GENERATED.inc(tokens, model=model_name)
+        if seconds > 0:
+            metrics.TOKENS_PER_SECOND.observe(tokens / seconds, model=model_name)
+    
+    def _generate_batched(self, key, text, deadline=None):
+        """Queue text with concurrent requests for the same model and tier and wait for its response"""
         try:
-            tokenizer, model = self.load_blenderbot_model()
-            if tokenizer is None or model is None:
-                return "Sorry, I'm having trouble loading the model. Please try again."
-            
-            # Encode input
-            inputs = tokenizer([text], return_tensors="pt")
-            
-            # Generate response
-            with torch.no_grad():
-                reply_ids = model.generate(**inputs, max_length=100, num_beams=5, temperature=0.7, do_sample=True)
-            
-            # Decode response
-            response = tokenizer.batch_decode(reply_ids, skip_special_tokens=True)[0]
-            return response.strip() if response.strip() else "I'm not sure how to respond to that."
-            
+            return self.scheduler.run(key, (text, deadline))
         except Exception as e:
             return f"Sorry, I encountered an error: {str(e)}"
     
-    def generate_response_flan_t5(self, text):
-        """Generate response using FLAN-T5"""
+    def _run_batch(self, key, items):
+        """Scheduler handler: run one padded batch through the model and decoding tier named by key"""
+        texts = [text for text, _ in items]
+        # The batch stops at the earliest deadline among its requests
+        deadlines = [deadline for _, deadline in items if deadline is not None]
+        deadline = min(deadlines) if deadlines else None
+        tier = DECODING_TIERS[key[-1]]
+        if key[0] == "dialogpt":
+            return self.generate_batch_dialogpt(texts, max_length=key[1], tier=tier, deadline=deadline)
+        elif key[0] == "blenderbot":
+            return self.generate_batch_blenderbot(texts, tier=tier, deadline=deadline)
+        return self.generate_batch_flan_t5(texts, tier=tier, deadline=deadline)
+    
+    def generate_batch_dialogpt(self, texts, max_length=100, tier=None, deadline=None):
+        """Generate responses for several messages in one DialoGPT forward pass"""
+        tokenizer, model = self.load_dialogpt_model()
+        if tokenizer is None or model is None:
+            return ["Sorry, I'm having trouble loading the model. Please try again."] * len(texts)
+        
+        tier = tier or resolve_tier()
+        if len(texts) > 1 and self._draft_for("dialogpt", tier) is not None:
+            # Assisted generation runs one sequence at a time
+            return [reply for text in texts for reply in self.generate_batch_dialogpt([text], max_length, tier, deadline)]
+        
+        # Decoder-only model: pad on the left so every prompt ends right before generation
+        template = self._template("dialogpt", tokenizer)
+        inputs = template.encode_batch(texts, padding_side="left")
+        input_length = inputs.input_ids.shape[-1]
+        
+        # Generate responses
+        start = time.perf_counter()
+        with torch.no_grad():
+            chat_history_ids = self._generate(
+                "dialogpt", model, tier,
+                **inputs,
+                max_length=input_length + max_length,
+                max_time=self._time_left(deadline),
+                no_repeat_ngram_size=2,
+                pad_token_id=tokenizer.eos_token_id
+            )
+        new_tokens = chat_history_ids[:, input_length:]
+        self._record_generation("dialogpt", int((new_tokens != tokenizer.eos_token_id).sum()), time.perf_counter() - start)
+        
+        # Decode only the newly generated tokens of each row
+        responses = template.decode_batch(new_tokens)
+        return [
+            response.strip() if response.strip() else "I'm not sure how to respond to that. Could you try rephrasing?"
+            for response in responses
+        ]
+    
+    def generate_batch_blenderbot(self, texts, tier=None, deadline=None):
+        """Generate responses for several messages in one BlenderBot forward pass"""
+        tokenizer, model = self.load_blenderbot_model()
+        if tokenizer is None or model is None:
+            return ["Sorry, I'm having trouble loading the model. Please try again."] * len(texts)
+        
+        # Encode input
+        template = self._template("blenderbot", tokenizer)
+        inputs = template.encode_batch(texts, truncation=True)
+        
+        # Generate responses
+        tier = tier or resolve_tier()
+        start = time.perf_counter()
+        with torch.no_grad():
+            reply_ids = model.generate(**inputs, max_length=tier.max_new_tokens, max_time=self._time_left(deadline),
+                                       **self._decoding_kwargs(tier))
+        self._record_generation("blenderbot", int((reply_ids != tokenizer.pad_token_id).sum()), time.perf_counter() - start)
+        
+        # Decode responses
+        responses = template.decode_batch(reply_ids)
+        return [response.strip() if response.strip() else "I'm not sure how to respond to that." for response in responses]
+    
+    def generate_batch_flan_t5(self, texts, tier=None, deadline=None):
+        """Generate responses for several messages in one FLAN-T5 forward pass"""
+        tokenizer, model = self.load_flan_t5_model()
+        if tokenizer is None or model is None:
+            return ["Sorry, I'm having trouble loading the model. Please try again."] * len(texts)
+        
+        tier = tier or resolve_tier()
+        if len(texts) > 1 and self._draft_for("flan_t5", tier) is not None:
+            # Assisted generation runs one sequence at a time
+            return [reply for text in texts for reply in self.generate_batch_flan_t5([text], tier, deadline)]
+        
+        # Encode input, with the instruction prefix ids reused from the template
+        template = self._template("flan_t5", tokenizer)
+        inputs = template.encode_batch(texts, truncation=True)
+        
+        # Generate responses
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = self._generate("flan_t5", model, tier, **inputs, max_length=tier.max_new_tokens,
+                                     max_time=self._time_left(deadline))
+        self._record_generation("flan_t5", int((outputs != tokenizer.pad_token_id).sum()), time.perf_counter() - start)
+        
+        # Decode responses
+        responses = template.decode_batch(outputs)
+        return [response.strip() if response.strip() else "I'm not sure how to respond to that." for response in responses]
+    
+    def stream_response(self, text, model_choice="DialoGPT (Fast)", session_id=None, budget=None, outcome=None):
+        """Yield the response as text chunks while the selected model is generating it.
+        
+        Errors arrive as a final "Sorry, ..." chunk; pass an outcome dict to learn about them,
+        as outcome["failed"] is set when the reply did not come from the model. outcome["seconds"]
+        and outcome["deadline_hit"] time the generation alone, not how fast the chunks were read.
+        """
+        outcome = {} if outcome is None else outcome
+        outcome.update(failed=False, seconds=0.0, deadline_hit=False)
+        if not TRANSFORMERS_AVAILABLE:
+            yield self.generate_fallback_response(text)
+            return
+        
+        tier = resolve_tier(budget)
+        start = time.monotonic()
+        deadline = start + tier.budget_seconds
+        if self.worker_pool is not None:
+            try:
+                outcome.update((yield from self.worker_pool.stream(text, model_choice, session_id, budget)) or {})
+            except Exception as e:
+                outcome.update(failed=True, seconds=time.monotonic() - start)
+                yield f"Sorry, I encountered an error: {str(e)}"
+            self.budget_stats.record(tier, outcome["seconds"], outcome["deadline_hit"])
+            return
+        
         try:
-            tokenizer, model = self.load_flan_t5_model()
+            if "BlenderBot" in model_choice:
+                name, (tokenizer, model) = "blenderbot", self.load_blenderbot_model()
+            elif "FLAN-T5" in model_choice:
+                name, (tokenizer, model) = "flan_t5", self.load_flan_t5_model()
+            else:
+                name, (tokenizer, model) = "dialogpt", self.load_dialogpt_model()
             if tokenizer is None or model is None:
-                return "Sorry, I'm having trouble loading the model. Please try again."
-            
-            # Format as instruction
-            prompt = f"Answer this question or respond to this statement: {text}"
+                outcome["failed"] = True
+                yield "Sorry, I'm having trouble loading the model. Please try again."
+                return
             
             # Encode input
-            input_ids = tokenizer(prompt, return_tensors="pt").input_ids
-            
-            # Generate response
-            with torch.no_grad():
-                outputs = model.generate(input_ids, max_length=100, num_beams=5, temperature=0.7, do_sample=True)
+            inputs = self._template(name, tokenizer).encode_batch([text])
+            if name == "dialogpt":
+                gen_kwargs = dict(
+                    max_length=inputs.input_ids.shape[-1] + tier.max_new_tokens,
+                    no_repeat_ngram_size=2,
+                    pad_token_id=tokenizer.eos_token_id
+                )
+            else:
+                gen_kwargs = dict(max_length=tier.max_new_tokens)
             
-            # Decode response
-            response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            return response.strip() if response.strip() else "I'm not sure how to respond to that."
+            # Streamers do not support beam search, so stream with a single beam
+            streamer = transformers.TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            if name == "dialogpt" and session_id is not None:
+                target, args = self.generate_with_context_dialogpt, (
+                    text, session_id, tier.max_new_tokens, streamer, tier, deadline
+                )
+            else:
+                gen_kwargs.update(inputs, streamer=streamer, max_time=self._time_left(deadline))
+                target, args = self._generate_no_grad, (name, model, tier, gen_kwargs)
+            errors, finished = [], []
+            thread = threading.Thread(target=self._run_streaming, args=(target, args, streamer, errors, finished),
+                                      daemon=True)
+            thread.start()
             
+            produced = False
+            for chunk in streamer:
+                if chunk:
+                    produced = produced or bool(chunk.strip())
+                    yield chunk
+            thread.join()
+            seconds = finished[0] - start
+            outcome.update(seconds=seconds, deadline_hit=seconds >= tier.budget_seconds)
+            self.budget_stats.record(tier, seconds, outcome["deadline_hit"])
+            if errors:
+                raise errors[0]
+            if not produced:
+                yield "I'm not sure how to respond to that."
         except Exception as e:
-            return f"Sorry, I encountered an error: {str(e)}"
+            outcome["failed"] = True
+            yield f"Sorry, I encountered an error: {str(e)}"
+    
+    def _run_streaming(self, target, args, streamer, errors, finished):
+        """Run a streaming generation, always ending the stream so the reader never hangs"""
+        try:
+            target(*args)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            finished.append(time.monotonic())
+            # generate ends the stream itself on success; a second end is harmless
+            streamer.end()
+    
+    def _generate_no_grad(self, name, model, tier, gen_kwargs):
+        """Run a single-beam generate for a streaming request on a background thread"""
+        with torch.no_grad():
+            self._generate(name, model, tier, single_beam=True, **gen_kwargs)
+    
+    def translate_stream(self, chunks, target_lang):
+        """Translate a stream of text chunks one complete sentence at a time"""
+        buffer = ""
+        for chunk in chunks:
+            buffer += chunk
+            # Everything up to the last sentence boundary is ready to translate
+            parts = re.split(r'(?<=[.!?。！？])\s+', buffer)
+            if len(parts) > 1:
+                buffer = parts.pop()
+                yield self.translate_text(" ".join(parts), target_lang) + " "
+        if buffer.strip():
+            yield self.translate_text(buffer, target_lang)
     
     def generate_fallback_response(self, text):
         """Generate a simple fallback response when AI models are not available"""
@@ -221,16 +816,34 @@ class MultiLanguageChatbot:
         import random
         return random.choice(responses)
     
-    def generate_response(self, text, model_choice="DialoGPT (Fast)"):
-        """Generate response based on selected model"""
+    def generate_response(self, text, model_choice="DialoGPT (Fast)", session_id=None, budget=None):
+        """Generate response based on selected model.
+        
+        budget is a latency tier name ("fast", "balanced", "accurate", "quality") or
+        a number of seconds. It picks the decoding strategy and token limit, and
+        generation stops at the deadline with whatever has been produced so far.
+        """
         if not TRANSFORMERS_AVAILABLE:
             return self.generate_fallback_response(text)
-            
-        if "DialoGPT" in model_choice:
-            return self.generate_response_dialogpt(text)
+        
+        tier = resolve_tier(budget)
+        start = time.monotonic()
+        deadline = start + tier.budget_seconds
+        if self.worker_pool is not None:
+            with metrics.span("generate_worker"):
+                try:
+                    response = self.worker_pool.generate(text, model_choice, session_id, budget)
+                except Exception as e:
+                    response = f"Sorry, I encountered an error: {str(e)}"
         elif "BlenderBot" in model_choice:
-            return self.generate_response_blenderbot(text)
+            with metrics.span("generate_blenderbot"):
+                response = self.generate_response_blenderbot(text, tier, deadline)
         elif "FLAN-T5" in model_choice:
-            return self.generate_response_flan_t5(text)
+            with metrics.span("generate_flan_t5"):
+                response = self.generate_response_flan_t5(text, tier, deadline)
         else:
-            return self.generate_response_dialogpt(text)  # Default fallback
+            with metrics.span("generate_dialogpt"):
+                response = self.generate_response_dialogpt(text, session_id=session_id, tier=tier, deadline=deadline)
+        seconds = time.monotonic() - start
+        self.budget_stats.record(tier, seconds, seconds >= tier.budget_seconds)
+        return response
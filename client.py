@@ -0,0 +1,147 @@
+import json
+import os
+
+
+class LocalChatClient:
+    """Runs the chat pipeline inside the current process"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.store = pipeline.store
+
+    def chat(self, message, model_choice, target_language="auto", enable_translation=True, session_id=None,
+             with_timings=False, budget=None):
+        return self.pipeline.process(message, model_choice, target_language, enable_translation, session_id,
+                                     with_timings, budget)
+
+    def stream(self, message, model_choice, target_language="auto", enable_translation=True, session_id=None,
+               with_timings=False, budget=None):
+        """Yield ("chunk", text) events and finally ("done", result)"""
+        return self.pipeline.stream(message, model_choice, target_language, enable_translation, session_id,
+                                    with_timings, budget)
+
+    def search_history(self, query=None, languages=None, cursor=None, limit=20, min_id=None):
+        return self.store.search(query, languages, cursor=cursor, limit=limit, min_id=min_id)
+
+    def languages(self):
+        return self.store.languages()
+
+    def history_version(self):
+        return self.store.version()
+
+    def clear_history(self, session_id=None):
+        """Delete every saved conversation, and the model's memory of session_id's conversation"""
+        self.store.clear()
+        if session_id is not None:
+            self.pipeline.chatbot.reset_context(session_id)
+
+    def prefetch_model(self, model_choice):
+        return self.pipeline.chatbot.prefetch_model(model_choice)
+
+    def model_status(self):
+        return self.pipeline.chatbot.status()
+
+
+class HTTPChatClient:
+    """Talks to a chatbot API server started with server.py"""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # Imported here so the in-process client does not pay for it
+        import requests
+        self.session = requests.Session()
+
+    def _url(self, path):
+        return f"{self.base_url}{path}"
+
+    def _payload(self, message, model_choice, target_language, enable_translation, session_id, with_timings,
+                 budget):
+        return {
+            "message": message,
+            "model": model_choice,
+            "target_language": target_language,
+            "translate": enable_translation,
+            "session_id": session_id,
+            "timings": with_timings,
+            "budget": budget,
+        }
+
+    def chat(self, message, model_choice, target_language="auto", enable_translation=True, session_id=None,
+             with_timings=False, budget=None):
+        response = self.session.post(
+            self._url("/chat"),
+            json=self._payload(message, model_choice, target_language, enable_translation, session_id, with_timings,
+                               budget),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream(self, message, model_choice, target_language="auto", enable_translation=True, session_id=None,
+               with_timings=False, budget=None):
+        """Yield ("chunk", text) events and finally ("done", result)"""
+        with self.session.post(
+            self._url("/chat/stream"),
+            json=self._payload(message, model_choice, target_language, enable_translation, session_id, with_timings,
+                               budget),
+            stream=True,
+            timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                if event.get("done"):
+                    event.pop("done")
+                    yield "done", event
+                else:
+                    yield "chunk", event["chunk"]
+
+    def search_history(self, query=None, languages=None, cursor=None, limit=20, min_id=None):
+        params = {"q": query or "", "language": languages or []}
+        if limit is not None:
+            params["limit"] = limit
+        if cursor is not None:
+            params["cursor"] = cursor
+        if min_id is not None:
+            params["min_id"] = min_id
+        response = self.session.get(self._url("/history"), params=params, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        return data["rows"], data["next_cursor"]
+
+    def languages(self):
+        response = self.session.get(self._url("/languages"), timeout=30)
+        response.raise_for_status()
+        return response.json()["languages"]
+
+    def history_version(self):
+        response = self.session.get(self._url("/history/version"), timeout=30)
+        response.raise_for_status()
+        return response.json()["version"]
+
+    def clear_history(self, session_id=None):
+        params = {"session_id": session_id} if session_id is not None else {}
+        self.session.delete(self._url("/history"), params=params, timeout=60).raise_for_status()
+
+    def prefetch_model(self, model_choice):
+        response = self.session.post(self._url("/models/prefetch"), json={"model": model_choice}, timeout=30)
+        response.raise_for_status()
+        return response.json()["prefetching"]
+
+    def model_status(self):
+        response = self.session.get(self._url("/models"), timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+
+def create_client(api_url=None, pipeline_factory=None):
+    """Use the API server when CHATBOT_API_URL is set, otherwise run the pipeline in-process"""
+    api_url = api_url or os.environ.get("CHATBOT_API_URL")
+    if api_url:
+        return HTTPChatClient(api_url)
+    return LocalChatClient(pipeline_factory())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Compare inference modes (fp32, int8, bf16, onnx) for each chatbot model.
+Reports load time, generation latency, memory (RSS) and how much the
+outputs drift from fp32, so the cheapest acceptable mode can be picked.
+
+Usage: python compare_inference_modes.py --models dialogpt,flan_t5 --modes fp32,int8
+"""
+
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from model_registry import rss_mb
+
+PROMPTS = [
+    "Hello, how are you today?",
+    "What is the capital of France?",
+    "Can you recommend a good book to read?",
+    "Why is the sky blue?",
+    "Tell me something interesting about space.",
+]
+
+LOADERS = {
+    "dialogpt": "load_dialogpt_model",
+    "blenderbot": "load_blenderbot_model",
+    "flan_t5": "load_flan_t5_model",
+}
+
+
+def generate(model_key, tokenizer, model, prompt):
+    """Greedy generation with the same prompt format as the chatbot, so modes are comparable"""
+    import torch
+    if model_key == "dialogpt":
+        inputs = tokenizer([prompt + tokenizer.eos_token], return_tensors="pt")
+        extra = dict(max_length=inputs.input_ids.shape[-1] + 100, pad_token_id=tokenizer.eos_token_id)
+    else:
+        if model_key == "flan_t5":
+            prompt = f"Answer this question or respond to this statement: {prompt}"
+        inputs = tokenizer([prompt], return_tensors="pt")
+        extra = dict(max_length=100)
+    with torch.no_grad():
+        output = model.generate(**inputs, num_beams=1, do_sample=False, **extra)
+    if model_key == "dialogpt":
+        output = output[:, inputs.input_ids.shape[-1]:]
+    return tokenizer.decode(output[0], skip_special_tokens=True).strip()
+
+
+def run_worker(model_key, mode, runs):
+    """Measure one model in one mode inside this (fresh) process and print JSON"""
+    from chatbot import MultiLanguageChatbot
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    tokenizer, model = getattr(MultiLanguageChatbot(), LOADERS[model_key])(mode)
+    load_seconds = time.perf_counter() - start
+    if model is None:
+        print(json.dumps({"error": "model failed to load"}))
+        return
+
+    outputs = []
+    latencies = []
+    for prompt in PROMPTS:
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = generate(model_key, tokenizer, model, prompt)
+            latencies.append(time.perf_counter() - start)
+        outputs.append(output)
+
+    rss_after = rss_mb()
+    latencies.sort()
+    print(json.dumps({
+        "load_seconds": round(load_seconds, 3),
+        "latency_mean_ms": round(1000 * sum(latencies) / len(latencies), 1),
+        "latency_p50_ms": round(1000 * latencies[len(latencies) // 2], 1),
+        "rss_mb": round(rss_after, 1) if rss_after else None,
+        "model_rss_mb": round(rss_after - rss_before, 1) if rss_after and rss_before else None,
+        "outputs": outputs,
+    }))
+
+
+def compare(reference, outputs):
+    """Exact-match rate and mean text similarity of outputs against the fp32 reference"""
+    exact = sum(a == b for a, b in zip(reference, outputs)) / len(reference)
+    similarity = sum(difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, outputs)) / len(reference)
+    return round(exact, 3), round(similarity, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", default="dialogpt,blenderbot,flan_t5")
+    parser.add_argument("--modes", default="fp32,int8,bf16,onnx")
+    parser.add_argument("--runs", type=int, default=3, help="generations per prompt")
+    parser.add_argument("--output", default="inference_modes_report.json")
+    parser.add_argument("--worker", nargs=2, metavar=("MODEL", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.runs)
+        return
+
+    modes = args.modes.split(",")
+    if "fp32" not in modes:
+        modes.insert(0, "fp32")  # reference for the quality deltas
+
+    print("⚖️  Multi-Language Chatbot - Inference Mode Comparison")
+    print("=" * 50)
+    report = {}
+    for model_key in args.models.split(","):
+        report[model_key] = {}
+        for mode in modes:
+            print(f"🔄 {model_key} / {mode}...")
+            # A fresh process per mode keeps the memory numbers independent
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", model_key, mode, "--runs", str(args.runs)],
+                capture_output=True, text=True
+            )
+            try:
+                report[model_key][mode] = json.loads(result.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                report[model_key][mode] = {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "no output"}
+
+        reference = report[model_key].get("fp32", {}).get("outputs")
+        for mode, result in report[model_key].items():
+            if reference and "outputs" in result:
+                result["exact_match"], result["similarity"] = compare(reference, result["outputs"])
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\n" + "=" * 50)
+    print(f"{'Model':<12}{'Mode':<7}{'Load s':>8}{'p50 ms':>9}{'RSS MB':>9}{'Exact':>7}{'Similar':>9}")
+    for model_key, modes_result in report.items():
+        for mode, result in modes_result.items():
+            if "error" in result:
+                print(f"{model_key:<12}{mode:<7}  ❌ {result['error']}")
+                continue
+            print(f"{model_key:<12}{mode:<7}{result['load_seconds']:>8}{result['latency_p50_ms']:>9}"
+                  f"{str(result['model_rss_mb']):>9}{result.get('exact_match', '-'):>7}{result.get('similarity', '-'):>9}")
+    print("=" * 50)
+    print(f"📄 Full report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
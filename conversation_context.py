@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+
+class DialogueContext:
+    """Token history and cached past key/values for one chat session"""
+
+    def __init__(self, max_tokens, low_watermark):
+        self.max_tokens = max_tokens
+        self.low_watermark = low_watermark
+        self.token_ids = []
+        self.segment_lengths = []
+        # Model cache covering token_ids[:cached_length]
+        self.past_key_values = None
+        self.cached_length = 0
+        self.lock = threading.Lock()
+
+    def prepare(self, new_ids, reserve):
+        """Return the ids to feed the model for a new message, truncating old turns to fit the budget"""
+        # A single message longer than the budget keeps only its tail
+        room = max(1, self.max_tokens - reserve)
+        if len(new_ids) > room:
+            new_ids = new_ids[-room:]
+
+        if len(self.token_ids) + len(new_ids) + reserve > self.max_tokens:
+            # Drop whole turns down to the low watermark so the cache is rebuilt rarely
+            target = max(0, self.low_watermark - len(new_ids) - reserve)
+            while self.segment_lengths and len(self.token_ids) > target:
+                dropped = self.segment_lengths.pop(0)
+                self.token_ids = self.token_ids[dropped:]
+            if len(self.token_ids) > target:
+                self.token_ids = self.token_ids[len(self.token_ids) - target:]
+            # Absolute positions shifted, so the old cache no longer applies
+            self.invalidate_cache()
+
+        return self.token_ids + list(new_ids)
+
+    def commit(self, sequence_ids, past_key_values, cached_length):
+        """Store the finished turn and the model cache that came with it"""
+        self.segment_lengths.append(len(sequence_ids) - len(self.token_ids))
+        self.token_ids = list(sequence_ids)
+        self.past_key_values = past_key_values
+        self.cached_length = cached_length
+
+    def invalidate_cache(self):
+        self.past_key_values = None
+        self.cached_length = 0
+
+    def __len__(self):
+        return len(self.token_ids)
+
+
+class ContextStore:
+    """Per-session dialogue contexts, keeping only the most recently used sessions.
+
+    Token histories are small, but a model cache costs memory per token
+    (about 192 KB per token for DialoGPT-medium in fp32). The caches of all
+    sessions together are capped at max_cached_tokens. Idle sessions give up
+    their cache first and keep only their token ids, so their next turn
+    rebuilds the cache.
+    """
+
+    def __init__(self, max_sessions=256, max_tokens=512, low_watermark=None, max_cached_tokens=2048):
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self.max_cached_tokens = max_cached_tokens
+        self.low_watermark = low_watermark if low_watermark is not None else max_tokens // 2
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return the context for a session, creating it if needed"""
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is None:
+                context = DialogueContext(self.max_tokens, self.low_watermark)
+                self._contexts[session_id] = context
+                while len(self._contexts) > self.max_sessions:
+                    self._contexts.popitem(last=False)
+            else:
+                self._contexts.move_to_end(session_id)
+            return context
+
+    def enforce_cache_budget(self):
+        """Drop the model caches of the least recently used sessions until the total fits max_cached_tokens"""
+        with self._lock:
+            contexts = list(self._contexts.values())
+        total = sum(context.cached_length for context in contexts)
+        for context in contexts:
+            if total <= self.max_cached_tokens:
+                break
+            # Sessions generating right now hold their lock and keep their cache
+            if context.cached_length and context.lock.acquire(blocking=False):
+                try:
+                    total -= context.cached_length
+                    context.invalidate_cache()
+                finally:
+                    context.lock.release()
+
+    def cached_tokens(self):
+        with self._lock:
+            return sum(context.cached_length for context in self._contexts.values())
+
+    def reset(self, session_id):
+        """Forget a session's conversation history"""
+        with self._lock:
+            self._contexts.pop(session_id, None)
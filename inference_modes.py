@@ -0,0 +1,151 @@
+import contextlib
+import json
+import logging
+import mmap
+import os
+import struct
+import warnings
+
+from lazy_imports import lazy_import, module_available
+
+logger = logging.getLogger(__name__)
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+onnxruntime = lazy_import("optimum.onnxruntime")
+TORCH_AVAILABLE = module_available("torch")
+ONNX_AVAILABLE = module_available("optimum.onnxruntime", "onnxruntime")
+
+
+INFERENCE_MODES = ("fp32", "int8", "bf16", "onnx")
+DEFAULT_INFERENCE_MODE = os.environ.get("CHATBOT_INFERENCE_MODE", "fp32")
+# Map fp32 safetensors weights into memory so processes holding the same model share its pages
+MMAP_WEIGHTS = os.environ.get("CHATBOT_MMAP_WEIGHTS", "").lower() in ("1", "true", "yes")
+ONNX_CACHE_DIR = os.environ.get("CHATBOT_ONNX_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "chatbot", "onnx"))
+
+
+def bf16_supported():
+    """True when the CPU has native bfloat16 instructions"""
+    if not TORCH_AVAILABLE:
+        return False
+    check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    if check is not None:
+        return bool(check())
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+    except OSError:
+        return False
+
+
+def _conv1d_to_linear(model):
+    """Swap GPT-2 style Conv1D layers for nn.Linear so dynamic quantization covers them"""
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        return model
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+
+def apply_inference_mode(model, mode):
+    """Convert a loaded fp32 PyTorch model to the requested precision"""
+    if mode == "int8":
+        model = _conv1d_to_linear(model)
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == "bf16":
+        if bf16_supported():
+            return model.to(torch.bfloat16)
+        warnings.warn("bf16 is not supported on this CPU, keeping fp32")
+    return model
+
+
+def load_onnx_model(model_name, seq2seq=False):
+    """Load an ONNX Runtime model, exporting it once and reusing the cached graph afterwards"""
+    if not ONNX_AVAILABLE:
+        raise ImportError("ONNX mode needs: pip install optimum[onnxruntime]")
+    model_class = onnxruntime.ORTModelForSeq2SeqLM if seq2seq else onnxruntime.ORTModelForCausalLM
+    path = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(path):
+        return model_class.from_pretrained(path)
+    model = model_class.from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    return model
+
+
+_SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def mmap_state_dict(path):
+    """Tensors of a .safetensors file backed by a copy-on-write memory map of the file.
+
+    Reads come straight from the page cache, so every process mapping the same
+    file shares the physical memory until it writes to a tensor.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header_size = struct.unpack("<Q", mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_size])
+    header.pop("__metadata__", None)
+
+    state_dict = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        if count == 0:
+            tensor = torch.empty(0, dtype=dtype)
+        else:
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=8 + header_size + start)
+        state_dict[name] = tensor.reshape(info["shape"])
+    return state_dict
+
+
+def load_mmap_model(model_class, model_name):
+    """Build model_name with its weights memory-mapped from the hub's model.safetensors.
+
+    Falls back to a normal from_pretrained when the repo has no safetensors file
+    or the checkpoint does not line up with the model's parameters.
+    """
+    from huggingface_hub import hf_hub_download
+    try:
+        path = hf_hub_download(model_name, "model.safetensors")
+    except Exception as e:
+        logger.warning("%s has no safetensors weights (%s); loading without mmap", model_name, e)
+        return model_class.from_pretrained(model_name)
+
+    config = transformers.AutoConfig.from_pretrained(model_name)
+    # Skip random initialisation; every parameter is replaced by the mapped tensors
+    no_init = getattr(transformers.modeling_utils, "no_init_weights", None)
+    with no_init() if no_init is not None else contextlib.nullcontext():
+        if hasattr(model_class, "from_config"):
+            model = model_class.from_config(config)
+        else:
+            model = model_class(config)
+
+    missing, _ = model.load_state_dict(mmap_state_dict(path), strict=False, assign=True)
+    model.tie_weights()
+    tied = set(getattr(model, "_tied_weights_keys", None) or ())
+    if set(missing) - tied:
+        logger.warning("%s: %d weights missing from the mapped checkpoint; loading without mmap",
+                       model_name, len(set(missing) - tied))
+        return model_class.from_pretrained(model_name)
+    return model.eval()
+
+
+def load_pretrained(model_class, model_name, mode):
+    """from_pretrained, memory-mapping the weights when CHATBOT_MMAP_WEIGHTS is set and they stay fp32"""
+    if MMAP_WEIGHTS and mode == "fp32":
+        return load_mmap_model(model_class, model_name)
+    return model_class.from_pretrained(model_name)
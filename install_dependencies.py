@@ -42,10 +42,11 @@ def main():
         ("pip install streamlit>=1.28.0", "Installing Streamlit"),
         ("pip install pandas>=1.3.0 numpy>=1.21.0", "Installing data processing libraries"),
         ("pip install requests>=2.25.0", "Installing requests"),
+        ("pip install aiohttp>=3.8.0", "Installing aiohttp (API server)"),
         ("pip install langdetect==1.0.9", "Installing language detection"),
         ("pip install googletrans==4.0.0rc1", "Installing Google Translate"),
         ("pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cpu", "Installing PyTorch (CPU version)"),
-        ("pip install transformers>=4.30.0", "Installing Transformers"),
+        ('pip install "transformers>=4.36.0"', "Installing Transformers"),
         ("pip install sentencepiece>=0.1.96", "Installing SentencePiece"),
         ("pip install protobuf>=3.20.0", "Installing Protocol Buffers"),
         ("pip install accelerate>=0.20.0", "Installing Accelerate")
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+import metrics
+from lazy_imports import lazy_import, module_available
+
+
+def _seed(module):
+    module.DetectorFactory.seed = 0
+
+
+# Only texts the script pass cannot decide need langdetect, so it is imported on first use
+langdetect = lazy_import("langdetect", on_import=_seed)
+LANGDETECT_AVAILABLE = module_available("langdetect")
+
+
+# Scripts that point to a language on their own: (code, ranges, confidence when the script dominates).
+# Han, Arabic, Devanagari and Cyrillic are shared by several languages (Japanese kanji, Persian, Urdu,
+# Marathi, Ukrainian...), so they stay below the 0.9 at which the pipeline names the source language
+# and translation keeps auto-detecting it.
+SCRIPTS = [
+    ('ko', [(0xAC00, 0xD7AF), (0x1100, 0x11FF), (0x3130, 0x318F)], 1.0),
+    ('ja', [(0x3040, 0x309F), (0x30A0, 0x30FF)], 1.0),
+    ('zh', [(0x4E00, 0x9FFF), (0x3400, 0x4DBF)], 0.85),
+    ('ar', [(0x0600, 0x06FF), (0x0750, 0x077F)], 0.85),
+    ('hi', [(0x0900, 0x097F)], 0.85),
+    ('ru', [(0x0400, 0x04FF)], 0.85),
+]
+
+# Latin text shorter than this many letters gets a proportionally lower confidence
+SHORT_TEXT_LETTERS = 20
+
+
+def script_counts(text):
+    """Count letters per distinctive script, plus the total number of letters"""
+    counts = {}
+    letters = 0
+    for char in text:
+        if not char.isalpha():
+            continue
+        letters += 1
+        point = ord(char)
+        if point < 0x0400:
+            continue
+        for code, ranges, _ in SCRIPTS:
+            if any(low <= point <= high for low, high in ranges):
+                counts[code] = counts.get(code, 0) + 1
+                break
+    return counts, letters
+
+
+class LanguageDetector:
+    """Layered language detection: Unicode script pass, then langdetect, behind an LRU cache"""
+
+    def __init__(self, cache_size=2048):
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, text):
+        """Return (language code, confidence between 0 and 1)"""
+        key = " ".join(text.split())
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                metrics.CACHE_HITS.inc(cache="language_detection")
+                return self._cache[key]
+            self.misses += 1
+        metrics.CACHE_MISSES.inc(cache="language_detection")
+
+        result = self._detect_uncached(key)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def detect_languages(self, texts):
+        """Detect several texts, running each distinct text only once"""
+        unique = {text: None for text in texts}
+        for text in unique:
+            unique[text] = self.detect(text)
+        return [unique[text] for text in texts]
+
+    def _detect_uncached(self, text):
+        counts, letters = script_counts(text)
+        if letters == 0:
+            return 'unknown', 0.0
+
+        # Japanese mixes kana with Han characters, so any kana decides it
+        if counts.get('ja'):
+            counts['ja'] += counts.pop('zh', 0)
+        if counts:
+            code = max(counts, key=counts.get)
+            share = counts[code] / letters
+            if share >= 0.5:
+                confidence = next(conf for c, _, conf in SCRIPTS if c == code)
+                return code, round(confidence * share, 3)
+
+        if not LANGDETECT_AVAILABLE:
+            return 'en', 0.0
+        try:
+            best = langdetect.detect_langs(text)[0]
+        except Exception:
+            return 'unknown', 0.0
+        code = best.lang.split('-')[0]
+        confidence = best.prob * min(1.0, letters / SHORT_TEXT_LETTERS)
+        return code, round(confidence, 3)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._cache),
+            }
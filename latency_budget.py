@@ -0,0 +1,89 @@
+import math
+import os
+import threading
+from collections import namedtuple
+
+import metrics
+
+# How to decode when a reply has budget_seconds to be generated
+DecodingTier = namedtuple("DecodingTier", "name budget_seconds num_beams do_sample max_new_tokens")
+
+DECODING_TIERS = {
+    "fast": DecodingTier("fast", 2.0, 1, False, 40),            # greedy
+    "balanced": DecodingTier("balanced", 5.0, 1, True, 80),     # sampling
+    "accurate": DecodingTier("accurate", 12.0, 3, True, 100),   # small beam
+    "quality": DecodingTier("quality", 30.0, 5, True, 100),     # the original 5-beam settings
+}
+
+DEFAULT_TIER = os.environ.get("CHATBOT_LATENCY_TIER", "quality")
+
+BUDGET_RATIO = metrics.REGISTRY.histogram(
+    "chatbot_latency_budget_ratio", "Generation time as a fraction of its latency budget",
+    buckets=(0.1, 0.25, 0.5, 0.75, 0.9, 1.0, 1.1, 1.5, 2)
+)
+DEADLINE_HITS = metrics.REGISTRY.counter("chatbot_deadline_hits_total", "Generations stopped at their deadline")
+
+
+def resolve_tier(budget=None):
+    """Pick the decoding tier for a budget given as a tier name, a number of seconds, or None for the default.
+
+    A number selects the slowest tier that fits it, and becomes the deadline itself.
+    """
+    if budget is None:
+        budget = DEFAULT_TIER
+    if isinstance(budget, str):
+        try:
+            return DECODING_TIERS[budget]
+        except KeyError:
+            try:
+                budget = float(budget)
+            except ValueError:
+                raise ValueError(
+                    f"Unknown latency tier {budget!r}; expected one of {', '.join(DECODING_TIERS)} or seconds"
+                ) from None
+
+    budget = float(budget)
+    if not math.isfinite(budget) or budget <= 0:
+        raise ValueError("Latency budget must be a positive, finite number of seconds")
+    tiers = sorted(DECODING_TIERS.values(), key=lambda tier: tier.budget_seconds)
+    fitting = [tier for tier in tiers if tier.budget_seconds <= budget]
+    tier = fitting[-1] if fitting else tiers[0]
+    return tier._replace(budget_seconds=budget)
+
+
+class BudgetStats:
+    """Actual generation time against the budget, per tier, for tuning the tiers"""
+
+    def __init__(self):
+        self._tiers = {}
+        self._lock = threading.Lock()
+
+    def record(self, tier, seconds, deadline_hit):
+        ratio = seconds / tier.budget_seconds
+        BUDGET_RATIO.observe(ratio, tier=tier.name)
+        if deadline_hit:
+            DEADLINE_HITS.inc(tier=tier.name)
+        with self._lock:
+            entry = self._tiers.setdefault(tier.name, {
+                "requests": 0, "deadline_hits": 0, "total_seconds": 0.0, "total_budget": 0.0, "max_ratio": 0.0
+            })
+            entry["requests"] += 1
+            entry["deadline_hits"] += int(deadline_hit)
+            entry["total_seconds"] += seconds
+            entry["total_budget"] += tier.budget_seconds
+            entry["max_ratio"] = max(entry["max_ratio"], ratio)
+
+    def stats(self):
+        """Per tier: requests, deadline hits, mean seconds, mean budget and mean/max actual-to-budget ratio"""
+        with self._lock:
+            return {
+                name: {
+                    "requests": entry["requests"],
+                    "deadline_hits": entry["deadline_hits"],
+                    "mean_seconds": round(entry["total_seconds"] / entry["requests"], 3),
+                    "mean_budget": round(entry["total_budget"] / entry["requests"], 3),
+                    "mean_ratio": round(entry["total_seconds"] / entry["total_budget"], 3),
+                    "max_ratio": round(entry["max_ratio"], 3),
+                }
+                for name, entry in self._tiers.items()
+            }
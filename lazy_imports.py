@@ -0,0 +1,65 @@
+import importlib
+import importlib.machinery
+import importlib.util
+import threading
+
+
+def _find_spec(name):
+    """find_spec that does not import parent packages of dotted names"""
+    top, _, rest = name.partition(".")
+    spec = importlib.util.find_spec(top)
+    for part in rest.split(".") if rest else ():
+        if spec is None or not spec.submodule_search_locations:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(f"{spec.name}.{part}", spec.submodule_search_locations)
+    return spec
+
+
+def module_available(*names):
+    """True if every named module is installed, without importing it (or its parent packages)"""
+    for name in names:
+        try:
+            if _find_spec(name) is None:
+                return False
+        except (ImportError, ValueError):
+            return False
+    return True
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    on_import(module) runs once right after the real import, for module-level
+    setup such as seeding.
+    """
+
+    def __init__(self, name, on_import=None):
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_import is not None:
+                        self._on_import(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name, on_import=None):
+    return LazyModule(name, on_import)
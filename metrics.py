@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+
+# Everything is a cheap no-op unless metrics are enabled (or a caller asked for a timing trace)
+ENABLED = os.environ.get("CHATBOT_METRICS", "").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}   # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in self._values.items():
+                for bound, count in zip(self.buckets, entry):
+                    samples.append((self.name + "_bucket", key, (("le", bound),), count))
+                samples.append((self.name + "_bucket", key, (("le", "+Inf"),), entry[-1]))
+                samples.append((self.name + "_sum", key, (), entry[-2]))
+                samples.append((self.name + "_count", key, (), entry[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._add(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("chatbot_stage_seconds", "Time spent in each pipeline stage")
+TOKENS_GENERATED = REGISTRY.counter("chatbot_tokens_generated_total", "Tokens generated per model")
+TOKENS_PER_SECOND = REGISTRY.histogram(
+    "chatbot_tokens_per_second", "Generation speed per model call",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+CACHE_HITS = REGISTRY.counter("chatbot_cache_hits_total", "Cache hits per cache")
+CACHE_MISSES = REGISTRY.counter("chatbot_cache_misses_total", "Cache misses per cache")
+QUEUE_DEPTH = REGISTRY.gauge("chatbot_queue_depth", "Requests waiting in a queue")
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "chatbot_model_load_seconds", "Time to load a model",
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+)
+
+
+# Spans and per-request traces
+
+_local = threading.local()
+
+
+def start_trace():
+    """Collect stage timings on this thread into a dict (stage -> seconds) until end_trace()"""
+    trace = {}
+    _local.trace = trace
+    return trace
+
+
+def end_trace():
+    _local.trace = None
+
+
+class _Span:
+    __slots__ = ("stage", "trace", "start")
+
+    def __init__(self, stage, trace):
+        self.stage = stage
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        if self.trace is not None:
+            self.trace[self.stage] = self.trace.get(self.stage, 0.0) + elapsed
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """Context manager timing a stage into the stage histogram and the current trace"""
+    trace = getattr(_local, "trace", None)
+    if not ENABLED and trace is None:
+        return _NULL_SPAN
+    return _Span(stage, trace)
+
+
+def format_timings(timings):
+    """Short caption text for stage -> milliseconds, like: detect_language 2 ms · generate_dialogpt 840 ms"""
+    return " · ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items())
+
+
+# Standalone endpoint for processes without the API server
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics on a background thread"""
+    # Imported here: http.server pulls in ssl and email, which most processes never need
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    enable()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,178 @@
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def rss_mb():
+    """Current resident set size of this process in MB, or None if unknown"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def model_size_mb(model):
+    """Bytes held by a PyTorch model's tensors, in MB (None for non-PyTorch models)"""
+    if not hasattr(model, "state_dict"):
+        return None
+    total = 0
+    seen = set()
+    values = list(model.state_dict().values())
+    while values:
+        value = values.pop()
+        if isinstance(value, (tuple, list)):
+            # Quantized layers keep packed weights as tuples
+            values.extend(value)
+            continue
+        if hasattr(value, "untyped_storage"):
+            storage = value.untyped_storage()
+            # Tied weights share one storage; count it once
+            if storage.data_ptr() in seen:
+                continue
+            seen.add(storage.data_ptr())
+            total += storage.nbytes()
+    return total / (1024 * 1024)
+
+
+class ModelRegistry:
+    """Loads models on demand and keeps them within a memory budget, evicting the least recently used.
+
+    loaders maps a model name to a callable(mode) returning (tokenizer, model);
+    a (None, None) result is treated as a failed load and is not cached.
+    """
+
+    def __init__(self, loaders, memory_budget_mb=None, max_events=200):
+        self.loaders = loaders
+        self.memory_budget_mb = memory_budget_mb
+        self.events = deque(maxlen=max_events)
+        self._models = OrderedDict()   # (name, mode) -> (tokenizer, model, size_mb)
+        self._known_sizes = {}
+        self._lock = threading.RLock()
+        self._load_locks = {}
+
+    def get(self, name, mode, keep=()):
+        """Return (tokenizer, model), loading it if needed; models in keep are not evicted to make room"""
+        key = (name, mode)
+        keep = {key, *keep}
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                tokenizer, model, _ = self._models[key]
+                return tokenizer, model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model; the others wait for it
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    tokenizer, model, _ = self._models[key]
+                    return tokenizer, model
+                # Make room up front when the size is known from an earlier load
+                self._evict_to_fit(self._known_sizes.get(key, 0), keep)
+
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            tokenizer, model = self.loaders[name](mode)
+            seconds = time.perf_counter() - start
+            if model is None:
+                self._record("load_failed", key, seconds=round(seconds, 3))
+                return tokenizer, model
+
+            metrics.MODEL_LOAD_SECONDS.observe(seconds, model=name)
+            size = model_size_mb(model)
+            if size is None:
+                rss_after = rss_mb()
+                size = max(0.0, rss_after - rss_before) if rss_after and rss_before else 0.0
+            with self._lock:
+                self._known_sizes[key] = size
+                self._models[key] = (tokenizer, model, size)
+                self._record("load", key, seconds=round(seconds, 3), size_mb=round(size, 1))
+                self._evict_to_fit(0, keep)
+            return tokenizer, model
+
+    def _evict_to_fit(self, incoming_mb, keep=()):
+        """Evict least recently used models, other than those in keep, until incoming_mb more fits the budget"""
+        if not self.memory_budget_mb:
+            return
+        for key in list(self._models):
+            if self.total_mb() + incoming_mb <= self.memory_budget_mb:
+                break
+            if key not in keep:
+                self.evict(*key, reason="budget")
+
+    def evict(self, name, mode, reason="manual"):
+        """Drop a model so its memory can be reclaimed"""
+        with self._lock:
+            entry = self._models.pop((name, mode), None)
+            if entry is None:
+                return False
+            self._record("evict", (name, mode), size_mb=round(entry[2], 1), reason=reason)
+        del entry
+        gc.collect()
+        return True
+
+    def prewarm(self, names, mode, warmup=None, background=True):
+        """Load (and optionally warm up with warmup(name)) models ahead of the first request"""
+        def run():
+            for i, name in enumerate(names):
+                try:
+                    start = time.perf_counter()
+                    # Models prewarmed together are used together, so one never evicts another
+                    self.get(name, mode, keep=[(earlier, mode) for earlier in names[:i]])
+                    if warmup is not None:
+                        warmup(name)
+                    self._record("prewarm", (name, mode), seconds=round(time.perf_counter() - start, 3))
+                except Exception as e:
+                    self._record("prewarm_failed", (name, mode), error=str(e))
+
+        if background:
+            thread = threading.Thread(target=run, name="model-prewarm", daemon=True)
+            thread.start()
+            return thread
+        run()
+
+    def fits(self, *keys):
+        """Whether the (name, mode) models fit the memory budget together, by their last known sizes"""
+        if not self.memory_budget_mb:
+            return True
+        with self._lock:
+            return sum(self._known_sizes.get(key, 0) for key in keys) <= self.memory_budget_mb
+
+    def is_loaded(self, name, mode):
+        with self._lock:
+            return (name, mode) in self._models
+
+    def total_mb(self):
+        with self._lock:
+            return sum(size for _, _, size in self._models.values())
+
+    def memory_usage(self):
+        """Estimated MB held by each loaded model, least recently used first"""
+        with self._lock:
+            return {f"{name} ({mode})": round(size, 1) for (name, mode), (_, _, size) in self._models.items()}
+
+    def recent_events(self):
+        """A copy of the recent load/evict events, oldest first"""
+        with self._lock:
+            return list(self.events)
+
+    def _record(self, event, key, **details):
+        entry = dict(event=event, model=key[0], mode=key[1], time=time.time(), **details)
+        with self._lock:
+            self.events.append(entry)
+        logger.info("model %s: %s/%s %s", event, key[0], key[1], details)
@@ -0,0 +1,154 @@
+import time
+
+import metrics
+from latency_budget import resolve_tier
+
+
+class ChatPipeline:
+    """The full message flow: detect -> translate -> generate -> translate back -> persist.
+
+    Shared by the Streamlit app (in-process) and the HTTP server so both
+    behave the same way.
+    """
+
+    def __init__(self, chatbot, store):
+        self.chatbot = chatbot
+        self.store = store
+
+    def _prepare(self, message, enable_translation):
+        """Detect the message language and translate it to English if needed"""
+        detection = self.chatbot.detect_language_info(message)
+        translated_message = message
+        if enable_translation and not self.chatbot.is_confidently_english(detection):
+            source_lang = detection["code"] if detection["confidence"] >= 0.9 else None
+            translated_message = self.chatbot.translate_text(message, 'en', source_lang)
+        return detection, translated_message
+
+    def prepare_many(self, messages, enable_translation=True):
+        """Batched _prepare: detect every message at once and translate them to English grouped by language"""
+        detections = self.chatbot.detect_languages(messages)
+        translated = list(messages)
+        groups = {}
+        for i, detection in enumerate(detections):
+            if enable_translation and not self.chatbot.is_confidently_english(detection):
+                source_lang = detection["code"] if detection["confidence"] >= 0.9 else None
+                groups.setdefault(source_lang, []).append(i)
+        for source_lang, indexes in groups.items():
+            results = self.chatbot.translate_batch([messages[i] for i in indexes], 'en', source_lang)
+            for i, result in zip(indexes, results):
+                translated[i] = result
+        return list(zip(detections, translated))
+
+    def generate(self, translated_message, model_choice="DialoGPT (Fast)", session_id=None, budget=None):
+        """Answer an English message through the response cache; returns (response, cached, deadline_hit)"""
+        tier = resolve_tier(budget)
+        key, response = self.chatbot.cached_response(translated_message, model_choice, session_id, budget=budget)
+        if response is None:
+            response = self.chatbot.similar_answer(translated_message, model_choice, session_id, budget)
+        if response is not None:
+            return response, True, False
+        start = time.monotonic()
+        response = self.chatbot.generate_response(translated_message, model_choice, session_id, budget)
+        deadline_hit = time.monotonic() - start >= tier.budget_seconds
+        # A reply cut off at the deadline depends on timing, so it is not reusable
+        if not deadline_hit:
+            self.chatbot.cache_response(key, response)
+            self.chatbot.index_answer(translated_message, response, model_choice, session_id, budget)
+        return response, False, deadline_hit
+
+    def _wants_translation_back(self, enable_translation, target_language):
+        return enable_translation and target_language not in ("auto", "english")
+
+    def _finish(self, message, response, detection, translated_message, model_choice, enable_translation,
+                session_id, trace, cached=False, tier=None, deadline_hit=False):
+        """Queue the turn for persistence and describe the result"""
+        with metrics.span("persist"):
+            self.store.save(message, response, detection["name"], translated_message, session_id)
+        result = {
+            "response": response,
+            "detected_language": detection["name"],
+            "language_code": detection["code"],
+            "confidence": detection["confidence"],
+            "translated_message": translated_message,
+            "model": model_choice,
+            "translated": enable_translation,
+            "cached": cached,
+            "tier": tier.name if tier is not None else None,
+            "deadline_hit": deadline_hit,
+        }
+        if trace is not None:
+            result["timings"] = {stage: round(1000 * seconds, 1) for stage, seconds in trace.items()}
+        return result
+
+    @staticmethod
+    def _collect(chunks, into):
+        """Pass chunks through while keeping a copy of the untranslated reply"""
+        for chunk in chunks:
+            into.append(chunk)
+            yield chunk
+
+    def process(self, message, model_choice="DialoGPT (Fast)", target_language="auto",
+                enable_translation=True, session_id=None, with_timings=False, budget=None):
+        """Run a message through the whole pipeline and return the result dict.
+
+        budget is a latency tier name or seconds for generation (see latency_budget).
+        With with_timings the result also has a "timings" dict of milliseconds per stage.
+        """
+        tier = resolve_tier(budget)
+        trace = metrics.start_trace() if with_timings else None
+        # A cold model loads while the message is detected and translated
+        self.chatbot.prefetch_model(model_choice, warmup=False)
+        try:
+            detection, translated_message = self._prepare(message, enable_translation)
+            response, cached, deadline_hit = self.generate(translated_message, model_choice, session_id, budget)
+            if self._wants_translation_back(enable_translation, target_language):
+                response = self.chatbot.translate_sentences(response, target_language)
+            return self._finish(message, response, detection, translated_message, model_choice,
+                                enable_translation, session_id, trace, cached, tier, deadline_hit)
+        finally:
+            if trace is not None:
+                metrics.end_trace()
+
+    def stream(self, message, model_choice="DialoGPT (Fast)", target_language="auto",
+               enable_translation=True, session_id=None, with_timings=False, budget=None):
+        """Like process, but yield ("chunk", text) events while generating and ("done", result) last"""
+        tier = resolve_tier(budget)
+        trace = metrics.start_trace() if with_timings else None
+        self.chatbot.prefetch_model(model_choice, warmup=False)
+        try:
+            detection, translated_message = self._prepare(message, enable_translation)
+            key, cached_reply = self.chatbot.cached_response(translated_message, model_choice, session_id,
+                                                             streaming=True, budget=budget)
+            if cached_reply is None:
+                cached_reply = self.chatbot.similar_answer(translated_message, model_choice, session_id, budget)
+            generated, outcome = [], {}
+            if cached_reply is not None:
+                chunks = iter([cached_reply])
+            else:
+                chunks = self._collect(
+                    self.chatbot.stream_response(translated_message, model_choice, session_id, budget, outcome),
+                    generated
+                )
+            if self._wants_translation_back(enable_translation, target_language):
+                # Translate back one complete sentence at a time
+                chunks = self.chatbot.translate_stream(chunks, target_language)
+
+            response = ""
+            with metrics.span("generate"):
+                for chunk in chunks:
+                    response += chunk
+                    yield "chunk", chunk
+            # Timed by the generation itself, so translating back and rendering chunks do not count
+            deadline_hit = cached_reply is None and outcome.get("deadline_hit", False)
+            if cached_reply is None and not deadline_hit and not outcome.get("failed"):
+                # A reply cut off at the deadline depends on timing, so it is not reusable, and one that
+                # ended in an error may not start with the error text once some of it streamed
+                self.chatbot.cache_response(key, "".join(generated).strip())
+                self.chatbot.index_answer(translated_message, "".join(generated).strip(), model_choice, session_id,
+                                          budget)
+            yield "done", self._finish(message, response.strip(), detection, translated_message, model_choice,
+                                       enable_translation, session_id, trace, cached_reply is not None, tier,
+                                       deadline_hit)
+        finally:
+            if trace is not None:
+                metrics.end_trace()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Import-time profile for the Multi-Language Chatbot modules.
+Imports each module in a fresh interpreter with -X importtime, reports the
+total cold-start cost and the slowest packages it pulled in, and checks that
+heavy ML libraries stay unloaded until a model is actually used.
+
+Usage:
+    python profile_imports.py                        # chatbot, pipeline, storage, client
+    python profile_imports.py --modules chatbot --top 15
+    python profile_imports.py --output imports.json --baseline old.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Libraries that must not be imported just to render the UI
+HEAVY_MODULES = ("torch", "transformers", "langdetect", "googletrans", "optimum", "pandas", "aiohttp", "requests")
+
+
+def profile_module(module):
+    """Import module in a new interpreter; return its import-time breakdown"""
+    check = (
+        f"import {module}; import sys, json; "
+        f"print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"}
+
+    # Lines look like "import time:   self [us] | cumulative | imported package", children
+    # before their parent, so the module's own imports are the lines just before its entry
+    subtree = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip()) - 1
+        name = name.strip()
+        if depth == 0 and name == module:
+            total_us = int(cumulative)
+            break
+        if depth == 0:
+            subtree = []
+        else:
+            subtree.append((name, int(cumulative)))
+
+    # Cost per top-level package, counting each package's outermost import
+    packages = {}
+    for name, cumulative in subtree:
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), cumulative)
+
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "heavy_loaded": json.loads(result.stdout.strip().splitlines()[-1]),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda p: -p[1])},
+    }
+
+
+def print_report(report, top, baseline=None):
+    print("🧊 Multi-Language Chatbot - Import Profile")
+    print("=" * 60)
+    for module, result in report.items():
+        if "error" in result:
+            print(f"❌ {module}: {result['error']}")
+            continue
+        line = f"📦 {module}: {result['total_ms']:.1f} ms"
+        if baseline and "total_ms" in baseline.get(module, {}):
+            before = baseline[module]["total_ms"]
+            if before:
+                line += f" ({100 * (result['total_ms'] - before) / before:+.1f}% vs baseline)"
+        print(line)
+        for name, ms in list(result["packages_ms"].items())[:top]:
+            print(f"     {name:<40} {ms:>9.1f} ms")
+        if result["heavy_loaded"]:
+            print(f"   ⚠️  heavy libraries imported: {', '.join(result['heavy_loaded'])}")
+        else:
+            print("   ✅ no heavy libraries imported")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", default="chatbot,pipeline,storage,client")
+    parser.add_argument("--top", type=int, default=8, help="slowest packages to list per module")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    report = {module: profile_module(module) for module in args.modules.split(",")}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, args.top, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Results written to {args.output}")
+    # Non-zero exit lets CI catch a heavy import sneaking back into the startup path
+    if any(result.get("heavy_loaded") or "error" in result for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from translation_cache import normalize_text
+
+
+class ResponseCache:
+    """LRU of generated replies keyed on (model, prompt, generation params, context hash).
+
+    Only meaningful with deterministic decoding, where the same key always
+    produces the same reply. With a db_path the entries are also kept in a
+    SQLite table so they survive restarts.
+    """
+
+    def __init__(self, db_path=None, max_entries=1024, max_disk_entries=50000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    model TEXT,
+                    prompt TEXT,
+                    params TEXT,
+                    context_hash TEXT,
+                    response TEXT,
+                    last_used REAL,
+                    PRIMARY KEY (model, prompt, params, context_hash)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used)')
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(model, prompt, params, context_hash=""):
+        return (model, normalize_text(prompt), params, context_hash)
+
+    def get(self, key):
+        """Return the cached reply for a key from make_key, or None on a miss"""
+        with self._lock:
+            response = self._memory.get(key)
+            if response is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return response
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    'SELECT response FROM response_cache '
+                    'WHERE model = ? AND prompt = ? AND params = ? AND context_hash = ?',
+                    key
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        'UPDATE response_cache SET last_used = ? '
+                        'WHERE model = ? AND prompt = ? AND params = ? AND context_hash = ?',
+                        (time.time(),) + key
+                    )
+                    self.conn.commit()
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        with self._lock:
+            self._remember(key, response)
+            if self.conn is not None:
+                self.conn.execute('INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?, ?)',
+                                  key + (response, time.time()))
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 1000:
+                    self._prune()
+                self.conn.commit()
+
+    def _remember(self, key, response):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self):
+        """Drop the least recently used rows beyond the disk limit"""
+        self._writes_since_prune = 0
+        self.conn.execute('''
+            DELETE FROM response_cache WHERE rowid IN (
+                SELECT rowid FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_disk_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.conn is not None:
+                self.conn.execute('DELETE FROM response_cache')
+                self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
@@ -0,0 +1,262 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+def _matches(row, terms, languages, since, until, session_id):
+    """Filter archived rows the way ConversationStore.search filters live ones"""
+    if languages and row.get("detected_language") not in languages:
+        return False
+    if since and (row.get("timestamp") or "") < since:
+        return False
+    if until and (row.get("timestamp") or "") >= until:
+        return False
+    if session_id and row.get("session_id") != session_id:
+        return False
+    if terms:
+        # Same semantics as the full-text index: every term is a prefix of some word
+        words = re.findall(r'\w+', f"{row.get('user_message') or ''} {row.get('bot_response') or ''}".lower())
+        return all(any(word.startswith(term) for word in words) for term in terms)
+    return True
+
+
+class ArchiveSegments:
+    """Conversations moved out of the database, as append-only gzip JSONL segments.
+
+    Each segment holds a contiguous id range, oldest first. manifest.json
+    records every segment's id and timestamp range, row count and languages,
+    so searches only open the segments that can match.
+    """
+
+    def __init__(self, directory, cache_segments=4):
+        self.directory = directory
+        self.cache_segments = cache_segments
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.segments = []
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as f:
+                self.segments = json.load(f)["segments"]
+
+    @property
+    def max_id(self):
+        with self._lock:
+            return self.segments[-1]["max_id"] if self.segments else 0
+
+    @property
+    def rows(self):
+        with self._lock:
+            return sum(segment["rows"] for segment in self.segments)
+
+    def _save_manifest(self):
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segments": self.segments}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path)
+
+    def append(self, rows):
+        """Write rows (dicts ordered by id, all newer than max_id) as a new segment"""
+        if not rows:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"segment-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        with open(path + ".tmp", "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        timestamps = [row["timestamp"] for row in rows if row.get("timestamp")]
+        with self._lock:
+            self.segments.append({
+                "file": name,
+                "min_id": rows[0]["id"],
+                "max_id": rows[-1]["id"],
+                "min_timestamp": min(timestamps) if timestamps else None,
+                "max_timestamp": max(timestamps) if timestamps else None,
+                "rows": len(rows),
+                "bytes": os.path.getsize(path),
+                "languages": sorted({row["detected_language"] for row in rows if row.get("detected_language")}),
+            })
+            self._save_manifest()
+
+    def _read(self, segment):
+        with self._lock:
+            rows = self._cache.get(segment["file"])
+            if rows is not None:
+                self._cache.move_to_end(segment["file"])
+                return rows
+        with gzip.open(os.path.join(self.directory, segment["file"]), "rt", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        with self._lock:
+            self._cache[segment["file"]] = rows
+            while len(self._cache) > self.cache_segments:
+                self._cache.popitem(last=False)
+        return rows
+
+    def search(self, query=None, languages=None, since=None, until=None, session_id=None, cursor=None, limit=20,
+               min_id=None):
+        """Archived rows matching the filters, newest first; limit=None returns every match"""
+        terms = [term.lower() for term in re.findall(r'\w+', query or "")]
+        with self._lock:
+            segments = list(reversed(self.segments))
+        results = []
+        for segment in segments:
+            # Skip segments whose ranges rule out every row
+            if cursor is not None and segment["min_id"] >= cursor:
+                continue
+            if min_id is not None and segment["max_id"] < min_id:
+                break
+            if languages and not set(languages) & set(segment["languages"]):
+                continue
+            if since and segment["max_timestamp"] and segment["max_timestamp"] < since:
+                continue
+            if until and segment["min_timestamp"] and segment["min_timestamp"] >= until:
+                continue
+            for row in reversed(self._read(segment)):
+                if cursor is not None and row["id"] >= cursor:
+                    continue
+                if min_id is not None and row["id"] < min_id:
+                    break
+                if _matches(row, terms, languages, since, until, session_id):
+                    results.append(row)
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
+
+    def languages(self):
+        with self._lock:
+            return sorted({language for segment in self.segments for language in segment["languages"]})
+
+    def clear(self):
+        """Delete every segment"""
+        with self._lock:
+            for segment in self.segments:
+                try:
+                    os.remove(os.path.join(self.directory, segment["file"]))
+                except FileNotFoundError:
+                    pass
+            self.segments = []
+            self._cache.clear()
+            if os.path.isdir(self.directory):
+                self._save_manifest()
+
+
+class RetentionManager:
+    """Keeps the conversations table small: archives old rows and reclaims free pages in the background"""
+
+    def __init__(self, store, max_age_days=30, interval_seconds=900, segment_rows=5000, vacuum_pages=512):
+        self.store = store
+        self.max_age_days = max_age_days
+        self.interval_seconds = interval_seconds
+        self.segment_rows = segment_rows
+        self.vacuum_pages = vacuum_pages
+        self.runs = 0
+        self.archived = 0
+        self.pages_freed = 0
+        self.last_run = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Archive rows older than max_age_days, then free unused pages a few at a time"""
+        archived = 0
+        if self.max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            archived = self.store.archive_before(cutoff, self.segment_rows)
+        freed = 0
+        while not self._stop.is_set():
+            pages = self.store.incremental_vacuum(self.vacuum_pages)
+            if not pages:
+                break
+            freed += pages
+            # Let queued writes in between steps
+            time.sleep(0.05)
+        self.runs += 1
+        self.archived += archived
+        self.pages_freed += freed
+        self.last_run = datetime.now().isoformat()
+        return archived, freed
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="conversation-retention", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        archive = self.store.archive
+        return {
+            "max_age_days": self.max_age_days,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+            "archived_rows": archive.rows if archive is not None else 0,
+            "archive_segments": len(archive.segments) if archive is not None else 0,
+            "archived_this_process": self.archived,
+            "pages_freed": self.pages_freed,
+        }
+
+
+def start_retention(store):
+    """Start background maintenance of a store; rows are only archived when CHATBOT_RETENTION_DAYS is set"""
+    days = os.environ.get("CHATBOT_RETENTION_DAYS")
+    return RetentionManager(
+        store,
+        max_age_days=float(days) if days and store.archive is not None else None,
+        interval_seconds=float(os.environ.get("CHATBOT_RETENTION_INTERVAL", 900)),
+    ).start()
+
+
+def main():
+    import argparse
+    from storage import ConversationStore
+
+    parser = argparse.ArgumentParser(description="Archive old conversations and compact the history database")
+    parser.add_argument("--db", default="chat_history.db")
+    parser.add_argument("--archive-dir", default="chat_archive")
+    parser.add_argument("--days", type=float, help="archive conversations older than this many days")
+    parser.add_argument("--convert", action="store_true",
+                        help="switch an older database to incremental auto-vacuum (one full VACUUM; stop the "
+                             "chatbot first)")
+    args = parser.parse_args()
+
+    store = ConversationStore(args.db, archive_dir=args.archive_dir)
+    try:
+        if args.convert:
+            try:
+                if store.enable_incremental_vacuum():
+                    print("🔧 Converted to incremental auto-vacuum")
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                return
+        archived, freed = RetentionManager(store, max_age_days=args.days).run_once()
+        print(f"📦 Archived {archived} conversation(s) to {args.archive_dir}, freed {freed} page(s)")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from array import array
+from collections import deque
+
+import metrics
+from lazy_imports import lazy_import, module_available
+
+np = lazy_import("numpy")
+transformers = lazy_import("transformers")
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_INDEX_AVAILABLE = module_available("numpy", "transformers", "torch")
+
+# Small sentence embedding model; a local directory works too, for fully offline use
+DEFAULT_EMBEDDING_MODEL = os.environ.get("CHATBOT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+class SentenceEmbedder:
+    """Mean-pooled, L2-normalised sentence embeddings from a small transformer, loaded on first use"""
+
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL, max_length=128):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._model = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                self._tokenizer = transformers.AutoTokenizer.from_pretrained(self.model_name)
+                model = transformers.AutoModel.from_pretrained(self.model_name)
+                model.eval()
+                self._model = model
+        return self._tokenizer, self._model
+
+    def __call__(self, texts):
+        """float32 array of shape (len(texts), dim) with unit-length rows"""
+        tokenizer, model = self._load()
+        inputs = tokenizer(list(texts), return_tensors="pt", padding=True, truncation=True,
+                           max_length=self.max_length)
+        with torch.no_grad():
+            hidden = model(**inputs).last_hidden_state
+        mask = inputs.attention_mask.unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, dim=-1)
+        return pooled.numpy().astype(np.float32)
+
+
+class SemanticIndex:
+    """Past answers searchable by the meaning of their question.
+
+    Embeddings are rows of one contiguous float32 file, appended as answers
+    are added and memory-mapped for search; entries.jsonl holds the question,
+    answer, model and tier of each row. Only each row's byte offset into
+    entries.jsonl and its model/tier group stay in memory; an entry is read
+    back when it is returned. A search is a single matrix-vector product over
+    every row. Past max_entries rows, both files are rewritten keeping the
+    newest rows.
+    """
+
+    def __init__(self, directory, embed=None, threshold=0.95, max_entries=50000, max_latency_samples=1000):
+        self.directory = directory
+        self.embed = embed or SentenceEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.lookups = 0
+        self.hits = 0
+        self.skipped = 0
+        self.compactions = 0
+        self._latencies = deque(maxlen=max_latency_samples)
+        self._lock = threading.Lock()
+        self._offsets = array("q")
+        self._groups = array("i")
+        self._group_ids = {}
+        self._end = 0
+        self._generation = 0
+        self._matrix = None
+        self._groups_array = None
+        self.dim = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._embeddings_path = os.path.join(directory, "embeddings.f32")
+        self._entries_path = os.path.join(directory, "entries.jsonl")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._load()
+        if self.max_entries and len(self._offsets) > self.max_entries:
+            self._compact()
+
+    def _group(self, model, tier):
+        return self._group_ids.setdefault((model, tier), len(self._group_ids))
+
+    def _load(self):
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        model_name = getattr(self.embed, "model_name", None)
+        if meta.get("model") != model_name or not meta.get("dim"):
+            if meta:
+                # Embeddings from another model are not comparable; start over
+                logger.warning("Semantic index was built with %s, not %s; rebuilding it", meta.get("model"), model_name)
+            for path in (self._embeddings_path, self._entries_path, self._meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        self.dim = meta["dim"]
+
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._embeddings_path) if os.path.exists(self._embeddings_path) else 0
+        rows = size // row_bytes
+        if os.path.exists(self._entries_path):
+            with open(self._entries_path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if len(self._offsets) == rows:
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # a torn last line from an interrupted append
+                    self._offsets.append(offset)
+                    self._groups.append(self._group(entry["model"], entry.get("tier")))
+                    offset += len(line)
+            self._end = offset
+        # Keep embeddings and entries aligned after an interrupted append
+        rows = len(self._offsets)
+        if size != rows * row_bytes:
+            with open(self._embeddings_path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        if os.path.exists(self._entries_path) and os.path.getsize(self._entries_path) != self._end:
+            with open(self._entries_path, "ab") as f:
+                f.truncate(self._end)
+
+    def _compact(self):
+        """Rewrite both files keeping the newest rows, down to 90% of max_entries"""
+        with self._lock:
+            drop = len(self._offsets) - int(0.9 * self.max_entries)
+            if drop <= 0:
+                return
+            row_bytes = self.dim * 4
+            for path, start in ((self._embeddings_path, drop * row_bytes), (self._entries_path, self._offsets[drop])):
+                with open(path, "rb") as src, open(path + ".tmp", "wb") as dst:
+                    src.seek(start)
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            # Embeddings first, as when appending: entries.jsonl decides how many rows are valid
+            os.replace(self._embeddings_path + ".tmp", self._embeddings_path)
+            os.replace(self._entries_path + ".tmp", self._entries_path)
+            base = self._offsets[drop]
+            self._offsets = array("q", (offset - base for offset in self._offsets[drop:]))
+            self._groups = self._groups[drop:]
+            self._end -= base
+            self._matrix = None
+            self._generation += 1
+            self.compactions += 1
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _rows(self):
+        """Memory-mapped embedding matrix and per-row group ids, remapped when rows were added or dropped"""
+        rows = len(self._offsets)
+        if rows == 0:
+            return None, None
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self._embeddings_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self._groups_array = np.frombuffer(self._groups, dtype=np.int32).copy()
+        return self._matrix, self._groups_array
+
+    def _read_entries(self, rows):
+        """Entries of several rows, read from entries.jsonl; call with the lock held"""
+        entries = []
+        with open(self._entries_path, "rb") as f:
+            for row in rows:
+                f.seek(self._offsets[row])
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    def _scores(self, vectors, model, tier):
+        """Similarity of each vector to every row, -inf for rows of another model or tier"""
+        with self._lock:
+            matrix, groups = self._rows()
+            group = self._group_ids.get((model, tier))
+            generation = self._generation
+        if matrix is None or group is None:
+            return None, generation
+        scores = np.dot(np.atleast_2d(vectors), matrix.T).view(np.ndarray)
+        scores[:, groups != group] = -np.inf
+        return scores, generation
+
+    def add_many(self, items):
+        """Index (question, answer, model, tier) tuples, skipping questions the index already answers"""
+        items = [item for item in items if item[0].strip() and item[1].strip()]
+        if not items:
+            return
+        vectors = np.ascontiguousarray(self.embed([item[0] for item in items]), dtype=np.float32)
+        keep = np.ones(len(items), dtype=bool)
+        for key in {(model, tier) for _, _, model, tier in items}:
+            indexes = [i for i, item in enumerate(items) if (item[2], item[3]) == key]
+            scores, _ = self._scores(vectors[indexes], *key)
+            if scores is not None:
+                keep[indexes] = scores.max(axis=1) < self.threshold
+        with self._lock:
+            self.skipped += int((~keep).sum())
+        items = [item for item, kept in zip(items, keep) if kept]
+        vectors = vectors[keep]
+        if not items:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": getattr(self.embed, "model_name", None), "dim": self.dim}, f)
+            # Embeddings first: entries.jsonl decides how many rows are valid
+            with open(self._embeddings_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._entries_path, "ab") as f:
+                for question, answer, model, tier in items:
+                    entry = {"question": question, "answer": answer, "model": model, "tier": tier}
+                    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+                    f.write(line)
+                    self._offsets.append(self._end)
+                    self._groups.append(self._group(model, tier))
+                    self._end += len(line)
+            full = self.max_entries and len(self._offsets) > self.max_entries
+        if full:
+            self._compact()
+
+    def add(self, question, answer, model, tier):
+        self.add_many([(question, answer, model, tier)])
+
+    def search(self, question, model, tier, k=1):
+        """The k most similar past questions of a model and tier as (similarity, entry), best first"""
+        query = self.embed([question])[0]
+        scores, generation = self._scores(query, model, tier)
+        if scores is None:
+            return []
+        scores = scores[0]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = [int(i) for i in top[np.argsort(-scores[top])] if np.isfinite(scores[i])]
+        with self._lock:
+            if generation != self._generation:
+                return []  # compacted meanwhile, so the row numbers are stale
+            entries = self._read_entries(top)
+        return [(float(scores[i]), entry) for i, entry in zip(top, entries)]
+
+    def lookup(self, question, model, tier):
+        """A stored answer to a question similar enough to this one, or None"""
+        start = time.perf_counter()
+        with metrics.span("semantic_lookup"):
+            matches = self.search(question, model, tier)
+        hit = bool(matches) and matches[0][0] >= self.threshold
+        with self._lock:
+            self.lookups += 1
+            self.hits += int(hit)
+            self._latencies.append(time.perf_counter() - start)
+        (metrics.CACHE_HITS if hit else metrics.CACHE_MISSES).inc(cache="semantic")
+        return matches[0][1]["answer"] if hit else None
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "entries": len(self._offsets),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "skipped_duplicates": self.skipped,
+                "compactions": self.compactions,
+                "lookup_mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "lookup_p95_ms": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else 0.0,
+            }
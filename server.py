@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Headless HTTP API for the Multi-Language Chatbot.
+Runs the full chat pipeline (detect -> translate -> generate -> translate
+back -> persist) behind JSON and streaming endpoints, so the bot can be
+called from other services and scaled separately from the Streamlit UI.
+
+Usage: python server.py --port 8000 --workers 4 --max-queue 32
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import metrics
+from chatbot import MultiLanguageChatbot
+from latency_budget import resolve_tier
+from pipeline import ChatPipeline
+from retention import start_retention
+from storage import ConversationStore
+
+logger = logging.getLogger("chatbot.server")
+
+
+class ChatServer:
+    """aiohttp application running blocking pipeline work in a bounded thread pool"""
+
+    def __init__(self, pipeline, store, workers=4, max_queue=32, shutdown_timeout=30, retention=None):
+        self.pipeline = pipeline
+        self.store = store
+        self.retention = retention
+        self.workers = workers
+        self.max_queue = max_queue
+        self.shutdown_timeout = shutdown_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-worker")
+        # History queries get their own threads so they never wait behind generations
+        self.store_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-worker")
+        self.in_flight = 0
+        self.draining = False
+        self._idle = None
+
+    def create_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get("/health", self.health),
+            web.post("/chat", self.chat),
+            web.post("/chat/stream", self.chat_stream),
+            web.get("/history", self.history),
+            web.delete("/history", self.clear_history),
+            web.get("/history/version", self.history_version),
+            web.get("/languages", self.languages),
+            web.get("/models", self.models),
+            web.post("/models/prefetch", self.prefetch_model),
+            web.get("/metrics", self.prometheus_metrics),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    # Backpressure
+
+    def _admit(self):
+        """Reserve a pipeline slot, or return an error response when the server cannot take more work"""
+        if self.draining:
+            return web.json_response({"error": "server is shutting down"}, status=503)
+        if self.in_flight >= self.workers + self.max_queue:
+            return web.json_response({"error": "too many requests"}, status=429, headers={"Retry-After": "1"})
+        self.in_flight += 1
+        self._idle.clear()
+        return None
+
+    def _release(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def _submit(self, func, *args):
+        """Run admitted work on the pool, freeing its slot when the work ends even if the client left"""
+        work = asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        work.add_done_callback(lambda _: self._release())
+        return work
+
+    async def _run(self, func, *args):
+        """Run a history store call off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.store_executor, func, *args)
+
+    # Handlers
+
+    async def health(self, request):
+        return web.json_response({
+            "status": "draining" if self.draining else "ok",
+            "in_flight": self.in_flight,
+            "capacity": self.workers + self.max_queue,
+            "retention": self.retention.stats() if self.retention is not None else None,
+        })
+
+    async def _read_chat_request(self, request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "body must be JSON"}), content_type="application/json")
+        message = str(body.get("message", "")).strip()
+        if not message:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "message is required"}), content_type="application/json")
+        budget = body.get("budget")
+        try:
+            resolve_tier(budget)
+        except (TypeError, ValueError) as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+        return (
+            message,
+            body.get("model", "DialoGPT (Fast)"),
+            body.get("target_language", "auto"),
+            bool(body.get("translate", True)),
+            body.get("session_id"),
+            bool(body.get("timings", False)),
+            budget,
+        )
+
+    async def chat(self, request):
+        args = await self._read_chat_request(request)
+        rejected = self._admit()
+        if rejected is not None:
+            return rejected
+        work = self._submit(self.pipeline.process, *args)
+        return web.json_response(await asyncio.shield(work))
+
+    async def chat_stream(self, request):
+        """Stream newline-delimited JSON: {"chunk": ...} lines, then {"done": true, ...result}"""
+        args = await self._read_chat_request(request)
+        rejected = self._admit()
+        if rejected is not None:
+            return rejected
+
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def produce():
+            # Runs on a worker thread; hands each event back to the event loop
+            try:
+                for event in self.pipeline.stream(*args):
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, ("error", str(e)))
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+        producer = self._submit(produce)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            kind, payload = event
+            if kind == "chunk":
+                line = {"chunk": payload}
+            elif kind == "done":
+                line = dict(payload, done=True)
+            else:
+                line = {"error": payload}
+            await response.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+        await producer
+        await response.write_eof()
+        return response
+
+    async def history(self, request):
+        query = request.query
+        try:
+            cursor = int(query["cursor"]) if query.get("cursor") else None
+            min_id = int(query["min_id"]) if query.get("min_id") else None
+            if query.get("limit"):
+                limit = min(int(query["limit"]), 200)
+            else:
+                # A min_id bound already caps the result to rows the caller has loaded
+                limit = None if min_id is not None else 20
+        except ValueError:
+            return web.json_response({"error": "cursor and limit must be integers"}, status=400)
+        rows, next_cursor = await self._run(lambda: self.store.search(
+            query=query.get("q"),
+            languages=query.getall("language", None),
+            since=query.get("since"),
+            until=query.get("until"),
+            session_id=query.get("session_id"),
+            cursor=cursor,
+            limit=limit,
+            min_id=min_id,
+        ))
+        return web.json_response({"rows": rows, "next_cursor": next_cursor})
+
+    async def clear_history(self, request):
+        await self._run(self.store.clear)
+        session_id = request.query.get("session_id")
+        if session_id:
+            # The session's conversation context goes too, so its next turn starts fresh
+            await self._run(self.pipeline.chatbot.reset_context, session_id)
+        return web.json_response({"cleared": True})
+
+    async def history_version(self, request):
+        """Changes whenever history is written or cleared, so clients know when to refetch"""
+        return web.json_response({"version": await self._run(self.store.version)})
+
+    async def languages(self, request):
+        return web.json_response({"languages": await self._run(self.store.languages)})
+
+    async def models(self, request):
+        return web.json_response(self.pipeline.chatbot.status())
+
+    async def prefetch_model(self, request):
+        """Start loading a model in the background, e.g. as soon as a user selects it"""
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "body must be JSON"}), content_type="application/json")
+        model = body.get("model", "DialoGPT (Fast)")
+        return web.json_response({"model": model, "prefetching": self.pipeline.chatbot.prefetch_model(model)},
+                                 status=202)
+
+    async def prometheus_metrics(self, request):
+        """Prometheus text exposition of the chatbot metrics"""
+        metrics.QUEUE_DEPTH.set(self.in_flight, queue="api_in_flight")
+        worker_pool = self.pipeline.chatbot.worker_pool
+        if worker_pool is not None:
+            for index, depth in enumerate(worker_pool.queue_depths()):
+                metrics.QUEUE_DEPTH.set(depth, queue=f"inference_worker_{index}")
+        return web.Response(text=metrics.REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    # Lifecycle
+
+    async def _on_startup(self, app):
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def _on_shutdown(self, app):
+        """Stop admitting work and let in-flight requests finish"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("shutting down with %d request(s) still running", self.in_flight)
+
+    async def _on_cleanup(self, app):
+        self.executor.shutdown(wait=True)
+        self.store_executor.shutdown(wait=True)
+        if self.retention is not None:
+            self.retention.stop()
+        if self.pipeline.chatbot.worker_pool is not None:
+            self.pipeline.chatbot.worker_pool.close()
+        # Flush queued conversation writes before the process exits
+        self.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-Language Chatbot API server")
+    parser.add_argument("--host", default=os.environ.get("CHATBOT_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("CHATBOT_API_PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("CHATBOT_API_WORKERS", 4)),
+                        help="threads running the chat pipeline")
+    parser.add_argument("--max-queue", type=int, default=int(os.environ.get("CHATBOT_API_MAX_QUEUE", 32)),
+                        help="requests allowed to wait for a worker before answering 429")
+    parser.add_argument("--db", default="chat_history.db")
+    parser.add_argument("--archive-dir", default=os.environ.get("CHATBOT_ARCHIVE_DIR", "chat_archive"),
+                        help="where conversations older than CHATBOT_RETENTION_DAYS are archived")
+    parser.add_argument("--no-metrics", action="store_true", help="disable the /metrics counters")
+    args = parser.parse_args()
+
+    metrics.enable(not args.no_metrics)
+    logging.basicConfig(level=logging.INFO)
+    store = ConversationStore(args.db, archive_dir=args.archive_dir)
+    chatbot = MultiLanguageChatbot()
+    if chatbot.worker_pool is not None and chatbot.worker_pool.prewarm:
+        # Accept requests only once every worker has its models, so none of them meets a cold start
+        print("⏳ Waiting for inference workers to load their models...")
+        if not chatbot.worker_pool.wait_ready(timeout=600):
+            logger.warning("inference workers are still loading; serving anyway")
+    server = ChatServer(ChatPipeline(chatbot, store), store,
+                        workers=args.workers, max_queue=args.max_queue, retention=start_retention(store))
+    print(f"🚀 Chatbot API listening on http://{args.host}:{args.port}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
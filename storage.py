@@ -0,0 +1,394 @@
+import atexit
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from retention import ArchiveSegments
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore:
+    """Chat history on one long-lived WAL-mode SQLite connection.
+
+    Inserts are queued and written by a background thread that commits them
+    in groups, so saving a message never waits on a disk sync. Queued rows
+    are flushed when the store is closed or the process exits. With an
+    archive_dir, rows moved out by archive_before stay searchable.
+    """
+
+    def __init__(self, db_path='chat_history.db', batch_size=64, archive_dir=None, delete_chunk_size=500,
+                 retry_seconds=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+        self.delete_chunk_size = delete_chunk_size
+        self.archive = ArchiveSegments(archive_dir) if archive_dir else None
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writes = 0
+        self.fts_enabled = False
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        # Only takes effect on a new database; older ones are converted by enable_incremental_vacuum
+        self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.init_schema()
+        if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            logger.warning("%s does not use incremental auto-vacuum, so archiving and clearing never shrink it; "
+                           "convert it while the chatbot is stopped: python retention.py --db %s --convert",
+                           db_path, db_path)
+
+        self._writer = threading.Thread(target=self._write_loop, name='conversation-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def init_schema(self):
+        """Create the conversations table and its indexes, upgrading older databases"""
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    user_message TEXT,
+                    bot_response TEXT,
+                    detected_language TEXT,
+                    translated_message TEXT,
+                    session_id TEXT
+                )
+            ''')
+            columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(conversations)')]
+            if 'session_id' not in columns:
+                self.conn.execute('ALTER TABLE conversations ADD COLUMN session_id TEXT')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations (session_id, id)')
+            # Lets languages() read distinct values from the index instead of scanning the table
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_conversations_language ON conversations (detected_language)'
+            )
+            self.conn.commit()
+            self._init_fts()
+
+    def _init_fts(self):
+        """Keep an FTS5 index over the message columns in sync through triggers"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations_fts'"
+        ).fetchone()
+        try:
+            with self.conn:
+                self.conn.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts
+                    USING fts5(user_message, bot_response, content='conversations', content_rowid='id')
+                ''')
+                self.conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+                        INSERT INTO conversations_fts (rowid, user_message, bot_response)
+                        VALUES (new.id, new.user_message, new.bot_response);
+                    END
+                ''')
+                self.conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+                        INSERT INTO conversations_fts (conversations_fts, rowid, user_message, bot_response)
+                        VALUES ('delete', old.id, old.user_message, old.bot_response);
+                    END
+                ''')
+                self.conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE ON conversations BEGIN
+                        INSERT INTO conversations_fts (conversations_fts, rowid, user_message, bot_response)
+                        VALUES ('delete', old.id, old.user_message, old.bot_response);
+                        INSERT INTO conversations_fts (rowid, user_message, bot_response)
+                        VALUES (new.id, new.user_message, new.bot_response);
+                    END
+                ''')
+                if not exists:
+                    # Index rows written before full-text search was enabled
+                    self.conn.execute("INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE scans
+            self.fts_enabled = False
+
+    def save(self, user_msg, bot_response, detected_lang, translated_msg, session_id=None):
+        """Queue a conversation turn for the background writer"""
+        if self._closed:
+            raise RuntimeError("ConversationStore is closed")
+        self._queue.put((datetime.now().isoformat(), user_msg, bot_response, detected_lang, translated_msg, session_id))
+        metrics.QUEUE_DEPTH.set(self._queue.qsize(), queue="conversation_writer")
+
+    def _write_loop(self):
+        # Turns that could not be written yet because the database was busy; retried before newer ones
+        pending = []
+        while True:
+            taken, stop = [], False
+            try:
+                row = self._queue.get(timeout=self.retry_seconds) if pending else self._queue.get()
+                if row is None:
+                    stop = True
+                else:
+                    taken.append(row)
+            except queue.Empty:
+                pass
+            # Take everything already waiting and commit it as one transaction
+            while not stop and len(pending) + len(taken) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                taken.append(row)
+            metrics.QUEUE_DEPTH.set(self._queue.qsize(), queue="conversation_writer")
+            rows = pending + taken
+            pending = self._write(rows)
+            if stop and pending:
+                # Last chance before the process exits: keep retrying for a little while
+                for _ in range(3):
+                    time.sleep(self.retry_seconds)
+                    pending = self._write(pending)
+                    if not pending:
+                        break
+                else:
+                    logger.error("Could not save %d conversation(s) before closing: database stayed locked",
+                                 len(pending))
+                    pending = []
+            # A turn is done once it is written (or cannot ever be), so flush waits for retries
+            for _ in range(len(rows) - len(pending) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, rows):
+        """Commit rows; returns the ones to retry because the database is busy"""
+        if not rows:
+            return []
+        start = time.perf_counter()
+        try:
+            self.insert_many(rows)
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="persist_commit")
+            return []
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                logger.warning("History database is busy; will retry %d conversation(s)", len(rows))
+                return rows
+            logger.exception("Failed to save %d conversation(s); saving them one at a time", len(rows))
+        except sqlite3.Error:
+            logger.exception("Failed to save %d conversation(s); saving them one at a time", len(rows))
+        # Only the rows that fail on their own are lost
+        retry = []
+        for row in rows:
+            try:
+                self.insert_many([row])
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    retry.append(row)
+                else:
+                    logger.exception("Dropped a conversation that cannot be saved")
+            except sqlite3.Error:
+                logger.exception("Dropped a conversation that cannot be saved")
+        return retry
+
+    def insert_many(self, rows):
+        """Insert (timestamp, user, bot, language, translated, session) rows in one transaction"""
+        with self._lock:
+            with self.conn:
+                self.conn.executemany('''
+                    INSERT INTO conversations
+                        (timestamp, user_message, bot_response, detected_language, translated_message, session_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+            self._writes += 1
+
+    def has_timestamp(self, timestamp):
+        """Whether any live conversation was saved with exactly this timestamp"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT 1 FROM conversations WHERE timestamp = ? LIMIT 1', (timestamp,)
+            ).fetchone() is not None
+
+    def flush(self):
+        """Block until every queued turn has been written"""
+        self._queue.join()
+
+    def search(self, query=None, languages=None, since=None, until=None, session_id=None, cursor=None, limit=20,
+               min_id=None):
+        """Find conversations, newest first, one page at a time.
+
+        Pagination is keyset-based: pass the returned cursor to get the next
+        (older) page, so each page costs the same however deep it is. Returns
+        (rows, next_cursor); next_cursor is None on the last page. With
+        limit=None every match from min_id upwards is returned. Archived rows
+        are older than every live one, so they continue the live results.
+        """
+        rows = self._search_live(query, languages, since, until, session_id, cursor, limit, min_id)
+        if self.archive is not None and (limit is None or len(rows) < limit):
+            live_ids = {row['id'] for row in rows}
+            archived = self.archive.search(query, languages, since, until, session_id, cursor, limit, min_id)
+            # A row can be in both for a moment while it is being archived
+            archived = [row for row in archived if row['id'] not in live_ids]
+            rows += archived if limit is None else archived[:limit - len(rows)]
+        next_cursor = rows[-1]['id'] if limit is not None and len(rows) == limit else None
+        return rows, next_cursor
+
+    def _search_live(self, query, languages, since, until, session_id, cursor, limit, min_id):
+        conditions = []
+        params = []
+        if query and query.strip():
+            terms = re.findall(r'\w+', query)
+            if self.fts_enabled and terms:
+                conditions.append('c.id IN (SELECT rowid FROM conversations_fts WHERE conversations_fts MATCH ?)')
+                params.append(' '.join(f'"{term}"*' for term in terms))
+            else:
+                conditions.append('(c.user_message LIKE ? OR c.bot_response LIKE ?)')
+                params.extend([f'%{query.strip()}%'] * 2)
+        if languages:
+            conditions.append(f'c.detected_language IN ({", ".join("?" * len(languages))})')
+            params.extend(languages)
+        if since:
+            conditions.append('c.timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('c.timestamp < ?')
+            params.append(until)
+        if session_id:
+            conditions.append('c.session_id = ?')
+            params.append(session_id)
+        if cursor is not None:
+            conditions.append('c.id < ?')
+            params.append(cursor)
+        if min_id is not None:
+            conditions.append('c.id >= ?')
+            params.append(min_id)
+
+        sql = 'SELECT c.* FROM conversations c'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY c.id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def languages(self):
+        """Distinct detected languages, for search filters"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT DISTINCT detected_language FROM conversations WHERE detected_language IS NOT NULL ORDER BY 1'
+            ).fetchall()
+        languages = {row[0] for row in rows}
+        if self.archive is not None:
+            languages.update(self.archive.languages())
+        return sorted(languages)
+
+    def version(self):
+        """A token that changes whenever conversations are inserted or cleared, by this or any other connection"""
+        with self._lock:
+            # data_version only moves for commits made through other connections
+            return f"{self._writes}.{self.conn.execute('PRAGMA data_version').fetchone()[0]}"
+
+    def _delete_chunked(self, condition='1', params=()):
+        """Delete matching rows a chunk per transaction, so queued writes get in between chunks"""
+        deleted = 0
+        while True:
+            with self._lock:
+                with self.conn:
+                    count = self.conn.execute(
+                        f'DELETE FROM conversations WHERE id IN '
+                        f'(SELECT id FROM conversations WHERE {condition} ORDER BY id LIMIT ?)',
+                        (*params, self.delete_chunk_size)
+                    ).rowcount
+                self._writes += 1
+            deleted += count
+            if count < self.delete_chunk_size:
+                return deleted
+
+    def clear(self):
+        """Delete every stored conversation, archived ones included"""
+        self.flush()
+        self._delete_chunked()
+        if self.archive is not None:
+            self.archive.clear()
+            self._writes += 1
+
+    def archive_before(self, cutoff, segment_rows=5000):
+        """Move conversations older than the ISO timestamp cutoff into the archive; returns rows moved.
+
+        Rows are archived by id up to the first one at or after cutoff, so the
+        archive always holds the oldest ids and continues the live table.
+        """
+        if self.archive is None:
+            return 0
+        moved = 0
+        while True:
+            with self._lock:
+                boundary = self.conn.execute(
+                    'SELECT MIN(id) FROM conversations WHERE timestamp >= ?', (cutoff,)
+                ).fetchone()[0]
+                condition, params = ('id < ?', (boundary,)) if boundary is not None else ('1', ())
+                rows = [dict(row) for row in self.conn.execute(
+                    f'SELECT * FROM conversations WHERE {condition} ORDER BY id LIMIT ?', (*params, segment_rows)
+                ).fetchall()]
+            if not rows:
+                return moved
+            # Rows already archived before an interrupted run are only deleted
+            self.archive.append([row for row in rows if row['id'] > self.archive.max_id])
+            moved += self._delete_chunked('id <= ?', (rows[-1]['id'],))
+            if len(rows) < segment_rows:
+                return moved
+
+    def enable_incremental_vacuum(self):
+        """Switch an older database to incremental auto-vacuum with a one-off full VACUUM.
+
+        Offline only: the VACUUM rewrites the whole file and blocks every other
+        connection until it is done. Raises RuntimeError while any other
+        connection, such as a running app or server, has the database open.
+        """
+        with self._lock:
+            if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return False
+            self.conn.execute('PRAGMA busy_timeout=0')
+            try:
+                # Leaving WAL mode needs the only connection to the database, so it doubles as the in-use check
+                try:
+                    mode = self.conn.execute('PRAGMA journal_mode=DELETE').fetchone()[0]
+                except sqlite3.OperationalError:
+                    mode = 'wal'
+                if mode == 'wal':
+                    raise RuntimeError(f"{self.db_path} is open on another connection; stop the chatbot before converting it")
+                self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                self.conn.execute('VACUUM')
+            finally:
+                self.conn.execute('PRAGMA journal_mode=WAL')
+                self.conn.execute('PRAGMA busy_timeout=30000')
+            return True
+
+    def incremental_vacuum(self, pages=512):
+        """Return up to pages free pages to the file system; returns how many were freed"""
+        with self._lock:
+            if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return 0
+            before = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not before:
+                return 0
+            self.conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+            return before - self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def close(self):
+        """Flush queued turns, stop the writer and close the connection"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._lock:
+            self.conn.close()
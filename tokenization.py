@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+
+import metrics
+from lazy_imports import lazy_import
+
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+# Rust-backed tokenizers are used unless this is "0"; each is checked against the slow one first
+FAST_TOKENIZERS = os.environ.get("CHATBOT_FAST_TOKENIZERS", "1") != "0"
+VERIFY_TOKENIZERS = os.environ.get("CHATBOT_VERIFY_TOKENIZERS", "1") != "0"
+
+# Texts the fast and slow tokenizers must encode and decode identically
+VERIFY_SAMPLES = [
+    "Hello, how are you today?",
+    "What's the capital of France? I'd like to know!!",
+    "Numbers like 3.14159, 1,000,000 and 42% are common.",
+    "Accents and symbols: café, naïve, Zürich, €5 & £3.",
+    "Answer this question or respond to this statement: why is the sky blue?",
+    "  Leading spaces,   repeated   spaces and trailing ones  ",
+    "Hola, ¿cómo estás? Je suis très content. Wie geht's?",
+]
+
+_equivalence = {}
+_lock = threading.Lock()
+
+
+def _mismatches(fast, slow, samples):
+    """Samples the two tokenizers encode or decode differently"""
+    different = []
+    for text in samples:
+        fast_ids = fast(text).input_ids
+        slow_ids = slow(text).input_ids
+        if fast_ids != slow_ids or (fast.decode(fast_ids, skip_special_tokens=True)
+                                    != slow.decode(slow_ids, skip_special_tokens=True)):
+            different.append(text)
+    return different
+
+
+def load_tokenizer(model_name, slow_class):
+    """The fast tokenizer for model_name if it matches slow_class on VERIFY_SAMPLES, otherwise the slow one"""
+    if not FAST_TOKENIZERS:
+        return slow_class.from_pretrained(model_name)
+    fast = transformers.AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    if not fast.is_fast:
+        return fast
+    if VERIFY_TOKENIZERS:
+        with _lock:
+            verified = _equivalence.get(model_name)
+        if verified is None:
+            different = _mismatches(fast, slow_class.from_pretrained(model_name), VERIFY_SAMPLES)
+            verified = {"fast": not different, "mismatches": different}
+            with _lock:
+                _equivalence[model_name] = verified
+        if not verified["fast"]:
+            logger.warning("Fast tokenizer for %s differs on %d sample(s); using the slow one",
+                           model_name, len(verified["mismatches"]))
+            return slow_class.from_pretrained(model_name)
+    return fast
+
+
+def equivalence_report():
+    """Per model: whether the fast tokenizer is in use and the samples it failed on"""
+    with _lock:
+        return {name: dict(result) for name, result in _equivalence.items()}
+
+
+class PromptTemplate:
+    """Encodes prefix + text + suffix with the constant parts tokenized once.
+
+    Message ids are concatenated between the cached prefix and suffix ids. At
+    construction the result is compared with tokenizing the whole string; if
+    they ever differ, encode falls back to whole-string tokenization.
+    """
+
+    def __init__(self, tokenizer, prefix="", suffix=""):
+        self.tokenizer = tokenizer
+        self.prefix = prefix
+        self.suffix = suffix
+        self.prefix_ids = tokenizer(prefix, add_special_tokens=False).input_ids if prefix else []
+        self.suffix_ids = tokenizer(suffix, add_special_tokens=False).input_ids if suffix else []
+        self.reserved = len(self.prefix_ids) + len(self.suffix_ids) + tokenizer.num_special_tokens_to_add()
+        self.exact = all(
+            self._concatenate(ids) == full
+            for ids, full in zip(self._text_ids(VERIFY_SAMPLES), self._full_ids(VERIFY_SAMPLES))
+        )
+
+    def _text_ids(self, texts):
+        return self.tokenizer(list(texts), add_special_tokens=False).input_ids
+
+    def _full_ids(self, texts, truncation=False):
+        return self.tokenizer([self.prefix + text + self.suffix for text in texts], truncation=truncation).input_ids
+
+    def _concatenate(self, ids, max_length=None):
+        if max_length is not None:
+            ids = ids[:max(0, max_length - self.reserved)]
+        return self.tokenizer.build_inputs_with_special_tokens(self.prefix_ids + ids + self.suffix_ids)
+
+    def encode_many(self, texts, truncation=False):
+        """Token id lists for several texts, tokenized in one call"""
+        with metrics.span("tokenize"):
+            if not self.exact:
+                return self._full_ids(texts, truncation)
+            max_length = self.tokenizer.model_max_length if truncation else None
+            return [self._concatenate(ids, max_length) for ids in self._text_ids(texts)]
+
+    def encode(self, text, truncation=False):
+        return self.encode_many([text], truncation)[0]
+
+    def encode_batch(self, texts, padding_side="right", truncation=False):
+        """Padded input_ids and attention_mask tensors for a batch of texts"""
+        rows = self.encode_many(texts, truncation)
+        width = max(len(ids) for ids in rows)
+        pad = self.tokenizer.pad_token_id
+        input_ids, attention_mask = [], []
+        for ids in rows:
+            padding = width - len(ids)
+            if padding_side == "left":
+                input_ids.append([pad] * padding + ids)
+                attention_mask.append([0] * padding + [1] * len(ids))
+            else:
+                input_ids.append(ids + [pad] * padding)
+                attention_mask.append([1] * len(ids) + [0] * padding)
+        return transformers.BatchEncoding({"input_ids": input_ids, "attention_mask": attention_mask},
+                                          tensor_type="pt")
+
+    def decode_batch(self, sequences):
+        """Text of each id sequence, without special tokens"""
+        with metrics.span("detokenize"):
+            return self.tokenizer.batch_decode(sequences, skip_special_tokens=True)
+
+    def decode(self, ids):
+        return self.decode_batch([ids])[0]
@@ -0,0 +1,177 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_imports import lazy_import, module_available
+from model_registry import ModelRegistry
+
+googletrans = lazy_import("googletrans")
+transformers = lazy_import("transformers")
+torch = lazy_import("torch")
+
+GOOGLETRANS_AVAILABLE = module_available("googletrans")
+LOCAL_TRANSLATION_AVAILABLE = module_available("transformers", "torch")
+
+
+class TranslationBackend:
+    """Interface for translation engines used by MultiLanguageChatbot"""
+
+    name = "base"
+
+    def translate_batch(self, texts, target_lang, source_lang=None):
+        """Translate several texts to target_lang; source_lang None means auto-detect"""
+        raise NotImplementedError
+
+    def translate(self, text, target_lang, source_lang=None):
+        return self.translate_batch([text], target_lang, source_lang)[0]
+
+
+class GoogleTranslateBackend(TranslationBackend):
+    """Online translation through the googletrans web client"""
+
+    name = "google"
+
+    def __init__(self, max_parallel=4):
+        self.max_parallel = max_parallel
+        self._local = threading.local()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def translator(self):
+        # Each thread gets its own googletrans client, created on its first translation
+        if getattr(self._local, "translator", None) is None:
+            self._local.translator = googletrans.Translator()
+        return self._local.translator
+
+    def _translate_one(self, text, target_lang, source_lang):
+        return self.translator.translate(text, dest=target_lang, src=source_lang or 'auto').text
+
+    def translate_batch(self, texts, target_lang, source_lang=None):
+        if len(texts) < 2:
+            return [self._translate_one(text, target_lang, source_lang) for text in texts]
+        # Every text is a separate web request, so send them concurrently
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="googletrans")
+        return list(self._executor.map(lambda text: self._translate_one(text, target_lang, source_lang), texts))
+
+
+class LocalTranslationBackend(TranslationBackend):
+    """Offline translation with small MarianMT models, loaded lazily per language pair.
+
+    The pairs live in their own ModelRegistry, so each pair loads under its own
+    lock and the least recently used ones are evicted past memory_budget_mb.
+    """
+
+    name = "local"
+
+    # (source, target) -> (model name, prefix selecting the target language)
+    MODELS = {
+        ('en', 'es'): ('Helsinki-NLP/opus-mt-en-es', ''),
+        ('es', 'en'): ('Helsinki-NLP/opus-mt-es-en', ''),
+        ('en', 'fr'): ('Helsinki-NLP/opus-mt-en-fr', ''),
+        ('fr', 'en'): ('Helsinki-NLP/opus-mt-fr-en', ''),
+        ('en', 'de'): ('Helsinki-NLP/opus-mt-en-de', ''),
+        ('de', 'en'): ('Helsinki-NLP/opus-mt-de-en', ''),
+        ('en', 'it'): ('Helsinki-NLP/opus-mt-en-it', ''),
+        ('it', 'en'): ('Helsinki-NLP/opus-mt-it-en', ''),
+        ('en', 'pt'): ('Helsinki-NLP/opus-mt-tc-big-en-pt', '>>por<< '),
+        ('pt', 'en'): ('Helsinki-NLP/opus-mt-ROMANCE-en', ''),
+        ('en', 'ru'): ('Helsinki-NLP/opus-mt-en-ru', ''),
+        ('ru', 'en'): ('Helsinki-NLP/opus-mt-ru-en', ''),
+        ('en', 'zh'): ('Helsinki-NLP/opus-mt-en-zh', '>>cmn_Hans<< '),
+        ('zh', 'en'): ('Helsinki-NLP/opus-mt-zh-en', ''),
+        ('en', 'ja'): ('Helsinki-NLP/opus-tatoeba-en-ja', ''),
+        ('ja', 'en'): ('Helsinki-NLP/opus-mt-ja-en', ''),
+        ('en', 'ko'): ('Helsinki-NLP/opus-mt-tc-big-en-ko', ''),
+        ('ko', 'en'): ('Helsinki-NLP/opus-mt-ko-en', ''),
+        ('en', 'ar'): ('Helsinki-NLP/opus-mt-en-ar', '>>ara<< '),
+        ('ar', 'en'): ('Helsinki-NLP/opus-mt-ar-en', ''),
+        ('en', 'hi'): ('Helsinki-NLP/opus-mt-en-hi', ''),
+        ('hi', 'en'): ('Helsinki-NLP/opus-mt-hi-en', ''),
+    }
+
+    def __init__(self, detect=None, max_batch_size=16, max_length=512, memory_budget_mb=1024):
+        # detect(text) -> language code, used when the caller does not know the source
+        self.detect = detect
+        self.max_batch_size = max_batch_size
+        self.max_length = max_length
+        self.registry = ModelRegistry(
+            {f"{source}-{target}": self._loader(model_name) for (source, target), (model_name, _) in self.MODELS.items()},
+            memory_budget_mb=memory_budget_mb
+        )
+
+    @staticmethod
+    def _loader(model_name):
+        def load(mode):
+            tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+            model = transformers.AutoModelForSeq2SeqLM.from_pretrained(model_name)
+            model.eval()
+            return tokenizer, model
+        return load
+
+    def load_pair(self, source_lang, target_lang):
+        """The tokenizer, model and target prefix of a language pair, loading the model if needed"""
+        _, prefix = self.MODELS[(source_lang, target_lang)]
+        tokenizer, model = self.registry.get(f"{source_lang}-{target_lang}", "fp32")
+        return tokenizer, model, prefix
+
+    def translate_batch(self, texts, target_lang, source_lang=None):
+        results = list(texts)
+        # Group texts by source language so each pair runs as one batch
+        groups = {}
+        for i, text in enumerate(texts):
+            source = source_lang or (self.detect(text) if self.detect else 'en')
+            groups.setdefault(source, []).append(i)
+
+        for source, indices in groups.items():
+            translated = self._translate_sentences([texts[i] for i in indices], source, target_lang)
+            for i, text in zip(indices, translated):
+                results[i] = text
+        return results
+
+    def _translate_sentences(self, texts, source_lang, target_lang):
+        """Translate texts sentence by sentence, pivoting through English when there is no direct model"""
+        if source_lang == target_lang or not texts:
+            return list(texts)
+        if (source_lang, target_lang) not in self.MODELS:
+            if source_lang != 'en' and target_lang != 'en':
+                return self._translate_sentences(self._translate_sentences(texts, source_lang, 'en'), 'en', target_lang)
+            raise ValueError(f"No offline model for {source_lang} -> {target_lang}")
+
+        # Split every text into sentences and translate them all together
+        split = [re.split(r'(?<=[.!?。！？])\s+', text.strip()) for text in texts]
+        sentences = [sentence for parts in split for sentence in parts]
+        translated = self._run_model(sentences, source_lang, target_lang)
+
+        results = []
+        position = 0
+        for parts in split:
+            results.append(" ".join(translated[position:position + len(parts)]))
+            position += len(parts)
+        return results
+
+    def _run_model(self, sentences, source_lang, target_lang):
+        tokenizer, model, prefix = self.load_pair(source_lang, target_lang)
+        outputs = []
+        for start in range(0, len(sentences), self.max_batch_size):
+            chunk = [prefix + sentence for sentence in sentences[start:start + self.max_batch_size]]
+            inputs = tokenizer(chunk, return_tensors="pt", padding=True, truncation=True, max_length=self.max_length)
+            with torch.no_grad():
+                generated = model.generate(**inputs, num_beams=1, max_length=self.max_length)
+            outputs.extend(tokenizer.batch_decode(generated, skip_special_tokens=True))
+        return outputs
+
+
+def create_translation_backend(name, detect=None):
+    """Build the translation backend selected by name, or None if it cannot run here"""
+    if name == "local":
+        budget = os.environ.get("CHATBOT_TRANSLATION_MEMORY_BUDGET_MB", "1024")
+        return LocalTranslationBackend(
+            detect=detect, memory_budget_mb=float(budget) if budget else None
+        ) if LOCAL_TRANSLATION_AVAILABLE else None
+    if name == "google":
+        return GoogleTranslateBackend() if GOOGLETRANS_AVAILABLE else None
+    raise ValueError(f"Unknown translation backend: {name}")
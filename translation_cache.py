@@ -0,0 +1,131 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize text so trivially different spellings share a cache entry"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class TranslationCache:
+    """In-memory LRU in front of a persistent SQLite table of translations"""
+
+    def __init__(self, db_path='translation_cache.db', max_entries=4096, max_disk_entries=100000,
+                 ttl_seconds=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            # A lost cache write only costs a retranslation, so skip the fsync per commit
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS translations (
+                    text TEXT,
+                    source TEXT,
+                    target TEXT,
+                    translation TEXT,
+                    created_at REAL,
+                    last_used REAL,
+                    PRIMARY KEY (text, source, target)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)')
+            self.conn.commit()
+
+    def get(self, text, source, target):
+        """Return the cached translation, or None on a miss"""
+        key = (normalize_text(text), source, target)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                translation, created_at = entry
+                if now - created_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return translation
+                del self._memory[key]
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    'SELECT translation, created_at FROM translations WHERE text = ? AND source = ? AND target = ?',
+                    key
+                ).fetchone()
+                if row is not None and now - row[1] < self.ttl_seconds:
+                    self.conn.execute(
+                        'UPDATE translations SET last_used = ? WHERE text = ? AND source = ? AND target = ?',
+                        (now,) + key
+                    )
+                    self.conn.commit()
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, text, source, target, translation):
+        """Store a translation in both tiers"""
+        key = (normalize_text(text), source, target)
+        now = time.time()
+        with self._lock:
+            self._remember(key, translation, now)
+            if self.conn is not None:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)',
+                    key + (translation, now, now)
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 1000:
+                    self._prune(now)
+                self.conn.commit()
+
+    def _remember(self, key, translation, created_at):
+        self._memory[key] = (translation, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self, now):
+        """Drop expired rows and the least recently used rows beyond the disk limit"""
+        self._writes_since_prune = 0
+        self.conn.execute('DELETE FROM translations WHERE created_at < ?', (now - self.ttl_seconds,))
+        self.conn.execute('''
+            DELETE FROM translations WHERE rowid IN (
+                SELECT rowid FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_disk_entries,))
+
+    def clear(self):
+        """Remove every cached translation"""
+        with self._lock:
+            self._memory.clear()
+            if self.conn is not None:
+                self.conn.execute('DELETE FROM translations')
+                self.conn.commit()
+
+    def stats(self):
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
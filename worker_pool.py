@@ -0,0 +1,233 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+
+def split_cores(workers, reserve=1):
+    """Divide this process's CPUs into one contiguous subset per worker.
+
+    The first `reserve` cores are left to the parent process (UI, translation,
+    database) when there are enough of them.
+    """
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = list(range(os.cpu_count() or 1))
+    if len(cores) - reserve >= workers:
+        cores = cores[reserve:]
+    per_worker = max(1, len(cores) // workers)
+    return [cores[i * per_worker:(i + 1) * per_worker] or cores[-per_worker:] for i in range(workers)]
+
+
+def _worker_main(index, cores, threads, requests, responses, prewarm):
+    """Entry point of a worker process: pin, load models, then serve generation requests"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Workers share weights through the page cache and keep no caches of their own
+    os.environ["CHATBOT_MMAP_WEIGHTS"] = "1"
+    os.environ["CHATBOT_INFERENCE_WORKERS"] = "0"
+    os.environ["CHATBOT_TRANSLATION_CACHE_DB"] = ""
+    os.environ["CHATBOT_RESPONSE_CACHE_DB"] = ""
+    os.environ["CHATBOT_SEMANTIC_INDEX"] = ""
+    os.environ["CHATBOT_PREWARM_MODELS"] = ""
+
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from chatbot import MultiLanguageChatbot
+    from inference_modes import DEFAULT_INFERENCE_MODE
+    chatbot = MultiLanguageChatbot()
+    if prewarm:
+        chatbot.registry.prewarm(prewarm, DEFAULT_INFERENCE_MODE, warmup=chatbot.warmup_model, background=False)
+    responses.put((index, None, "ready", None))
+
+    while True:
+        request_id, kind, args = requests.get()
+        if kind == "stop":
+            break
+        try:
+            if kind == "generate":
+                responses.put((index, request_id, "result", chatbot.generate_response(*args)))
+            elif kind == "stream":
+                outcome = {}
+                for chunk in chatbot.stream_response(*args, outcome=outcome):
+                    responses.put((index, request_id, "chunk", chunk))
+                responses.put((index, request_id, "result", outcome))
+            elif kind == "reset":
+                chatbot.reset_context(*args)
+                responses.put((index, request_id, "result", None))
+        except Exception as e:
+            responses.put((index, request_id, "error", str(e)))
+
+
+class InferenceWorkerPool:
+    """Model replicas in separate processes, each pinned to its own cores.
+
+    Requests go to the worker with the fewest in flight; a chat session sticks
+    to the worker that holds its conversation history. A worker that dies is
+    replaced: its in-flight requests fail, and its sessions start over on
+    whichever worker they are routed to next.
+    """
+
+    def __init__(self, workers, threads_per_worker=None, reserve_cores=1, prewarm=(), max_sessions=4096):
+        self._context = multiprocessing.get_context("spawn")
+        self.core_sets = split_cores(workers, reserve_cores)
+        self.threads_per_worker = threads_per_worker
+        self.prewarm = list(prewarm)
+        self.in_flight = [0] * workers
+        self.restarts = [0] * workers
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._pending = {}   # request id -> (events queue, worker index)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Semaphore(0)
+        self._responses = self._context.Queue()
+        self._queues = [None] * workers
+        self._processes = [None] * workers
+        self._closed = False
+        for index in range(workers):
+            self._spawn(index)
+        threading.Thread(target=self._read_responses, name="inference-pool-reader", daemon=True).start()
+
+    def _spawn(self, index):
+        cores = self.core_sets[index]
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, cores, self.threads_per_worker or len(cores), requests, self._responses, self.prewarm),
+            name=f"inference-worker-{index}", daemon=True
+        )
+        process.start()
+        self._queues[index] = requests
+        self._processes[index] = process
+
+    def _replace_dead(self, index):
+        """If worker index has died, fail its requests, forget its sessions and start a new worker"""
+        with self._lock:
+            process = self._processes[index]
+            if self._closed or process.is_alive():
+                return
+            for session_id in [session for session, worker in self._sessions.items() if worker == index]:
+                del self._sessions[session_id]
+            failed = [request_id for request_id, (_, worker) in self._pending.items() if worker == index]
+            for request_id in failed:
+                events, _ = self._pending.pop(request_id)
+                events.put(("error", f"inference worker {index} exited"))
+            self.in_flight[index] = 0
+            self.restarts[index] += 1
+            self._spawn(index)
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded its models"""
+        for _ in self._processes:
+            if not self._ready.acquire(timeout=timeout):
+                return False
+        return True
+
+    def _route(self, session_id):
+        """Pick a worker: the session's worker if it has one, otherwise the least loaded"""
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is not None and not self._processes[index].is_alive():
+                # Its history died with the worker; start the session over elsewhere
+                del self._sessions[session_id]
+                index = None
+            if index is not None:
+                self._sessions.move_to_end(session_id)
+            else:
+                alive = [i for i, process in enumerate(self._processes) if process.is_alive()]
+                index = min(alive or range(len(self.in_flight)), key=self.in_flight.__getitem__)
+                if session_id is not None:
+                    self._sessions[session_id] = index
+                    while len(self._sessions) > self.max_sessions:
+                        self._sessions.popitem(last=False)
+            return index
+
+    def _submit(self, kind, args, index):
+        request_id = next(self._ids)
+        events = queue.Queue()
+        with self._lock:
+            self.in_flight[index] += 1
+            self._pending[request_id] = (events, index)
+            requests = self._queues[index]
+        requests.put((request_id, kind, args))
+        return events
+
+    def _read_responses(self):
+        while True:
+            index, request_id, event, value = self._responses.get()
+            if event == "ready":
+                self._ready.release()
+                continue
+            with self._lock:
+                entry = self._pending.get(request_id)
+                if entry is not None and event != "chunk":
+                    del self._pending[request_id]
+                    self.in_flight[index] -= 1
+            if entry is not None:
+                entry[0].put((event, value))
+
+    def _next_event(self, events, index):
+        """Wait for the next event of a request; a dead worker is replaced and the request gets an error event"""
+        while True:
+            try:
+                return events.get(timeout=1)
+            except queue.Empty:
+                self._replace_dead(index)
+
+    def generate(self, text, model_choice, session_id=None, budget=None):
+        """Generate a full reply on a worker"""
+        index = self._route(session_id)
+        events = self._submit("generate", (text, model_choice, session_id, budget), index)
+        event, value = self._next_event(events, index)
+        if event == "error":
+            raise RuntimeError(value)
+        return value
+
+    def stream(self, text, model_choice, session_id=None, budget=None):
+        """Yield reply chunks from a worker as they are generated; returns the worker's outcome dict"""
+        index = self._route(session_id)
+        events = self._submit("stream", (text, model_choice, session_id, budget), index)
+        while True:
+            event, value = self._next_event(events, index)
+            if event == "chunk":
+                yield value
+            elif event == "error":
+                raise RuntimeError(value)
+            else:
+                return value
+
+    def reset(self, session_id):
+        """Forget a session's history on the worker that holds it"""
+        with self._lock:
+            index = self._sessions.pop(session_id, None)
+        if index is not None:
+            self._next_event(self._submit("reset", (session_id,), index), index)
+
+    def queue_depths(self):
+        """Requests in flight on each worker"""
+        with self._lock:
+            return list(self.in_flight)
+
+    def stats(self):
+        with self._lock:
+            return [
+                {"worker": index, "cores": cores, "in_flight": self.in_flight[index],
+                 "alive": self._processes[index].is_alive(), "restarts": self.restarts[index]}
+                for index, cores in enumerate(self.core_sets)
+            ]
+
+    def close(self, timeout=10):
+        with self._lock:
+            self._closed = True
+        for requests in self._queues:
+            requests.put((None, "stop", None))
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()